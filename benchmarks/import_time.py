@@ -0,0 +1,87 @@
+"""
+Cold-start import times of the models and utils packages.
+
+Each statement runs in a fresh interpreter (as in a spawned worker process), and the
+heavy dependencies it loaded are reported. Results can be appended to a CSV, to
+track them over time:
+
+    python benchmarks/import_time.py --repeat 5 --output benchmarks/import_times.csv
+"""
+import sys
+import json
+import argparse
+import subprocess
+import numpy as np
+from pathlib import Path
+from datetime import datetime
+
+repo_path = Path(__file__).parent.parent
+
+STATEMENTS = [
+    "import models",
+    "from models import CrossSpatialCorrLB13",
+    "from models import CrossSpatialCorrMCB18",
+    "from models import CrossSpatialCorrMAO26",
+    "import utils",
+    "from utils import compute_numerators",
+    "from utils.corr_engine import residual_tables",
+    "from utils.pipeline import run_pipeline",
+    "from utils import compute_gmm_predictions",
+]
+HEAVY_MODULES = ["openquake", "pandas", "scipy"]
+
+CHILD = """
+import sys, time, json
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, [m for m in {heavy!r} if m in sys.modules]]))
+"""
+
+
+def time_import(statement, repeat=3):
+    """
+    Returns the median time [s] of `statement` over `repeat` fresh interpreters,
+    and the heavy modules it loaded.
+    """
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", CHILD.format(statement=statement, heavy=HEAVY_MODULES)],
+                                cwd=repo_path, capture_output=True, text=True, check=True).stdout
+        elapsed, loaded = json.loads(output.splitlines()[-1])
+        times.append(elapsed)
+    return float(np.median(times)), loaded
+
+
+def get_revision():
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo_path,
+                            capture_output=True, text=True)
+    return result.stdout.strip() or "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per statement")
+    parser.add_argument("--output", type=Path, help="CSV to append the results to")
+    args = parser.parse_args()
+
+    timestamp, revision = datetime.now().isoformat(timespec="seconds"), get_revision()
+    rows = []
+    for statement in STATEMENTS:
+        elapsed, loaded = time_import(statement, args.repeat)
+        rows.append([timestamp, revision, statement, elapsed, " ".join(loaded)])
+        print(f"{elapsed * 1000:8.1f} ms  {statement:<50} loads: {', '.join(loaded) or '-'}")
+
+    if args.output is not None:
+        import csv
+        new_file = not args.output.exists()
+        with open(args.output, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["Timestamp", "Revision", "Statement", "Seconds", "Loaded"])
+            writer.writerows(rows)
+        print(f"Saved: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -31,15 +31,14 @@ models = {
 
 # --- Compute direct MAO26 correlation for chosen period ---
 im = f"Saavg2({chosen_period})"
-direct_mao = [CrossSpatialCorrMAO26(im, im, h, cluster=0) for h in h_model]
+direct_mao = CrossSpatialCorrMAO26(im, im, h_model, cluster=0)
 
 # --- Compute indirect (Sa(T)) curves for each model ---
 model_curves = {
-    name: [[
-        (func(f"Sa({t})", f"Sa({t})", h, cluster=0) if name == "MAO26"
-         else func(t, t, h) if name != "DN21"
-         else func(f"SA({t})", f"SA({t})", h))
-        for h in h_model]
+    name: [
+        (func(f"Sa({t})", f"Sa({t})", h_model, cluster=0) if name == "MAO26"
+         else func(t, t, h_model) if name != "DN21"
+         else func(f"SA({t})", f"SA({t})", h_model))
         for t in periods]
     for name, (func, _) in models.items()
 }
@@ -1,12 +1,10 @@
 from pathlib import Path
 from utils.gmm_calculator import compute_gmm_predictions
 from utils.stdev_and_corr import (
-    process_stdev_combinations, compute_correlations,
-    compute_numerators, compute_denominators)
+    process_stdev_combinations, compute_numerators, compute_denominators)
 from utils.corr_final import compute_final_corr
 from utils.stdev_and_corr_total import (
-    process_stdev_combinations_total, compute_correlations_total,
-    compute_numerators_total, compute_denominators_total)
+    process_stdev_combinations_total, compute_numerators_total, compute_denominators_total)
 from utils.corr_final_total import compute_final_corr_total
 
 
@@ -15,6 +13,7 @@ def main_within():
     im = 'Saavg2' # could be 'Saavg2' or 'Saavg3
     base_path = Path(__file__).parent
     data_path = base_path / "data" / "Database.csv"
+    gmm_cache_dir = base_path / "gmm_cache"  # shared by the within and total pipelines
     predicted_dir = base_path / "outputs_within" / "predicted_files"
     stdev_dir = base_path / "outputs_within" / "stdev_comb"
     corr_output_dir = base_path / "outputs_within" / f"WithinCorr_{im}_ind"
@@ -24,13 +23,15 @@ def main_within():
     # add the periods that you want, but be aware of the GMM period limits!
 
     print("\n=== STEP 1: GMM PREDICTIONS ===")
-    compute_gmm_predictions(im, data_path, predicted_dir, avgsa_periods)
+    # Only the stdevs of a representative scenario are needed downstream
+    compute_gmm_predictions(im, data_path, predicted_dir, avgsa_periods, stdev_only=True,
+                            cache_dir=gmm_cache_dir)
 
     print("\n=== STEP 2: STDEV COMBINATIONS & CORRELATIONS ===")
     process_stdev_combinations(predicted_dir, stdev_dir, avgsa_periods)
-    compute_correlations(stdev_dir, avgsa_periods)
     compute_numerators(stdev_dir, avgsa_periods)
     compute_denominators(stdev_dir, avgsa_periods)
+    # compute_correlations(stdev_dir, avgsa_periods)  # optional: per-pair correlation table (debug)
 
     print("\n=== STEP 3: FINAL CORRELATIONS ===")
     compute_final_corr(stdev_dir, corr_output_dir, avgsa_periods)
@@ -42,6 +43,7 @@ def main_total():
     im = 'Saavg2' # could be 'Saavg2' or 'Saavg3
     base_path = Path(__file__).parent
     data_path = base_path / "data" / "Database.csv"
+    gmm_cache_dir = base_path / "gmm_cache"  # shared by the within and total pipelines
     predicted_dir = base_path / "outputs_total" / "predicted_files"
     stdev_dir = base_path / "outputs_total" / "stdev_comb"
     corr_output_dir = base_path / "outputs_total" / f"TotalCorr_{im}_ind"
@@ -51,13 +53,15 @@ def main_total():
     # add the periods that you want, but be aware of the GMM period limits!
 
     print("\n=== STEP 1: GMM PREDICTIONS ===")
-    compute_gmm_predictions(im, data_path, predicted_dir, avgsa_periods)
+    # Only the stdevs of a representative scenario are needed downstream
+    compute_gmm_predictions(im, data_path, predicted_dir, avgsa_periods, stdev_only=True,
+                            cache_dir=gmm_cache_dir)
 
     print("\n=== STEP 2: STDEV COMBINATIONS & CORRELATIONS ===")
     process_stdev_combinations_total(predicted_dir, stdev_dir, avgsa_periods)
-    compute_correlations_total(stdev_dir, avgsa_periods)
     compute_numerators_total(stdev_dir, avgsa_periods)
     compute_denominators_total(stdev_dir, avgsa_periods)
+    # compute_correlations_total(stdev_dir, avgsa_periods)  # optional: per-pair correlation table (debug)
 
     print("\n=== STEP 3: FINAL CORRELATIONS ===")
     compute_final_corr_total(stdev_dir, corr_output_dir, avgsa_periods)
@@ -1,22 +1,35 @@
 # flake8: noqa
 import inspect
-from .bakerjayaram08 import corrBJ08
-from .duning21 import CrossSpatialCorrDN21
-from .jayarambaker09 import SpatialCorrJB09
-from .lothbaker13 import CrossSpatialCorrLB13
-from .markhvidaEtAl18 import CrossSpatialCorrMCB18
-from .monteiroEtAl26 import CrossSpatialCorrMAO26
-
-
-ALIASES = {
-    "bakerjayaram08": corrBJ08,
-    "duning21": CrossSpatialCorrDN21,
-    "jayarambaker09": SpatialCorrJB09,
-    "lothbaker13": CrossSpatialCorrLB13,
-    "markhvidaEtAl18": CrossSpatialCorrMCB18,
-    "monteiroEtAl26": CrossSpatialCorrMAO26,
+import importlib
+
+# The models are imported on first access (e.g. `from models import CrossSpatialCorrLB13`
+# only loads lothbaker13), so importing the package does not load scipy or pandas
+MODEL_MODULES = {
+    "corrBJ08": "bakerjayaram08",
+    "CrossSpatialCorrDN21": "duning21",
+    "SpatialCorrJB09": "jayarambaker09",
+    "CrossSpatialCorrLB13": "lothbaker13",
+    "CrossSpatialCorrMCB18": "markhvidaEtAl18",
+    "CrossSpatialCorrMAO26": "monteiroEtAl26",
 }
 
+# Common interface of the models (see protocol.py)
+PROTOCOL_NAMES = ["IM", "CorrelationModel", "ModelLB13", "ModelMCB18", "ModelDN21",
+                  "ModelMAO26", "ModelMarkov", "MODELS", "get_model"]
+
+__all__ = list(MODEL_MODULES) + PROTOCOL_NAMES + ["ALIASES", "select_func_args"]
+
+
+def __getattr__(name):
+    if name in MODEL_MODULES:
+        module = importlib.import_module(f".{MODEL_MODULES[name]}", __name__)
+        return getattr(module, name)
+    if name in PROTOCOL_NAMES:
+        return getattr(importlib.import_module(".protocol", __name__), name)
+    if name == "ALIASES":
+        return {module: __getattr__(func) for func, module in MODEL_MODULES.items()}
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def select_func_args(function):
     sig = inspect.signature(function)
@@ -14,30 +14,29 @@ import numpy as np
 
 
 def corrBJ08(T1, T2):
-
-    T_min, T_max = min(T1, T2), max(T1, T2)
+    """
+    T1 and T2 may be scalars or arrays, broadcast against each other.
+    """
+    T1, T2 = np.asarray(T1, dtype=float), np.asarray(T2, dtype=float)
+    T_min, T_max = np.minimum(T1, T2), np.maximum(T1, T2)
 
     C1 = 1 - np.cos((np.pi / 2) - 0.366 *
                     np.log(T_max / np.maximum(T_min, 0.109)))
 
-    if T_max < 0.2:
-        C2 = 1 - 0.105 * (1 - (1 / (1 + np.exp(100 * T_max - 5)))
-                          ) * ((T_max - T_min) / T_max - 0.0099)
-    else:
-        C2 = 0
+    # exp overflows (to C2 = 0 anyway) for the long periods where C2 is not used
+    with np.errstate(over='ignore'):
+        C2 = np.where(T_max < 0.2,
+                      1 - 0.105 * (1 - (1 / (1 + np.exp(100 * T_max - 5)))
+                                   ) * ((T_max - T_min) / T_max - 0.0099),
+                      0)
 
-    C3 = C2 if T_max < 0.109 else C1
+    C3 = np.where(T_max < 0.109, C2, C1)
 
-    C4 = C1 + 0.5 * (np.sqrt(C3) - C3) * (1 + np.cos((np.pi * T_min) / 0.109))
+    with np.errstate(invalid='ignore'):
+        C4 = C1 + 0.5 * (np.sqrt(C3) - C3) * (1 + np.cos((np.pi * T_min) / 0.109))
 
     # Determine the rho based on the conditions
-    if T_max < 0.109:
-        rho = C2
-    elif T_min > 0.109:
-        rho = C1
-    elif T_max < 0.2:
-        rho = np.min([C2, C4])
-    else:
-        rho = C4
-
-    return rho
+    rho = np.select([T_max < 0.109, T_min > 0.109, T_max < 0.2],
+                    [C2, C1, np.minimum(C2, C4)], default=C4)
+
+    return rho[()]
@@ -13,7 +13,6 @@ Earthquake Spectra, 37(1), 486–504. https://doi.org/10.1177/8755293020952442
 
 
 import numpy as np
-from scipy.interpolate import interp1d
 
 # Use numeric placeholders for PGA and PGV: -1.0 for PGA, -2.0 for PGV
 T_list = np.array(['SA(0.01)', 'SA(0.05)', 'SA(0.075)',
@@ -60,8 +59,43 @@ nested_para = np.array([
 pcs_dict = {label: pcs[i, :] for i, label in enumerate(T_list)}
 
 
+# Sa periods and PCs of the table, with the log-periods used for interpolation
+sa_rows = np.array([label.startswith("SA(") for label in T_list])
+sa_periods = np.array([float(label[3:-1]) for label in T_list[sa_rows]])
+sa_pcs = pcs[sa_rows]
+log_periods = np.log(sa_periods)
+
+
+def interpolate_pcs(periods):
+    """
+    PCs of Sa at the periods, array (*periods.shape, 7), linearly interpolated
+    (and extrapolated) in log-period for all periods at once. Tabulated periods
+    return the table values.
+    """
+    periods = np.asarray(periods, dtype=float)
+    # Make sure period is within interpolation range
+    if np.any((periods < 0.01) | (periods > 10)):
+        raise ValueError(
+            f"Periods {periods} are outside the interpolation range [0.01, 10].")
+
+    log_target = np.log(periods)
+    hi = np.clip(np.searchsorted(log_periods, log_target), 1, len(log_periods) - 1)
+    lo = hi - 1
+    slope = (sa_pcs[hi] - sa_pcs[lo]) / (log_periods[hi] - log_periods[lo])[..., None]
+    interpolated_pc = slope * (log_target - log_periods[lo])[..., None] + sa_pcs[lo]
+
+    on_table = sa_periods[hi] == periods
+    return np.where(on_table[..., None], sa_pcs[hi], interpolated_pc)
+
+
 def get_pc(label):
-    """Fetch or interpolate principal component values by IM label."""
+    """
+    Fetch or interpolate principal component values by IM label (e.g. 'SA(0.3)', 'PGV'),
+    or by Sa period(s) in seconds. Returns an array (7, *periods.shape) for periods.
+    """
+    if not isinstance(label, str):
+        return np.moveaxis(interpolate_pcs(label), -1, 0)
+
     if label in pcs_dict:
         return pcs_dict[label]
 
@@ -71,38 +105,7 @@ def get_pc(label):
             period = float(label[3:-1])
         except ValueError:
             raise ValueError(f"Could not parse period from label '{label}'.")
-
-        # Make sure period is within interpolation range
-        if not (0.01 <= period <= 10):
-            raise ValueError(
-                f"Period {period} is outside the interpolation range [0.01, 10].")
-
-        # Extract known SA periods and PCs
-        sa_periods = []
-        sa_pcs = []
-
-        for i, name in enumerate(T_list):
-            if name.startswith("SA("):
-                try:
-                    p = float(name[3:-1])
-                    sa_periods.append(p)
-                    sa_pcs.append(pcs[i, :])
-                except ValueError:
-                    continue
-
-        sa_periods = np.array(sa_periods)
-        sa_pcs = np.array(sa_pcs)
-
-        # Interpolate each PC component in log-space
-        log_periods = np.log(sa_periods)
-        log_target = np.log(period)
-
-        interpolated_pc = np.zeros(pcs.shape[1])
-        for i in range(pcs.shape[1]):
-            f_interp = interp1d(
-                log_periods, sa_pcs[:, i], kind='linear', fill_value='extrapolate')
-            interpolated_pc[i] = f_interp(log_target)
-        return interpolated_pc
+        return interpolate_pcs(period)
 
     raise ValueError(
         f"IM label '{label}' not found and cannot be interpolated.")
@@ -111,11 +114,16 @@ def get_pc(label):
 
 
 def CrossSpatialCorrDN21(IM1, IM2, h):
+    """
+    IM1 and IM2 are IM labels (e.g. 'SA(0.3)', 'PGA') or Sa periods in seconds,
+    which may be arrays broadcast against h.
+    """
     # Interpolated PCs
     pc1 = get_pc(IM1)
     pc2 = get_pc(IM2)
+    h = np.asarray(h, dtype=float)
 
-    Inugget = 1 if h == 0 else 0
+    Inugget = (h == 0) * 1
     
     C_h = 0.0
     Cii_0 = 0.0
@@ -137,3 +145,22 @@ def CrossSpatialCorrDN21(IM1, IM2, h):
 
     return C_h_other
 
+
+def CoregionalizationTermsDN21(T, h):
+    """
+    Linear model of coregionalization form of the model, in which all periods share
+    the nested structures: rho_ij(h) = sum_k L_ik * L_jk * C_k(h).
+
+    Returns:
+        L (np.ndarray): Normalized PC loadings of the Sa periods T, array (n_T, 7).
+        C (np.ndarray): Covariance of each nested structure at h, array (7, *h.shape).
+    """
+    pc = interpolate_pcs(np.atleast_1d(np.asarray(T, dtype=float)))
+    h = np.asarray(h, dtype=float)
+    Inugget = (h == 0) * 1
+
+    c0, c1, a1, c2, a2 = (nested_para[:, m].reshape((-1,) + (1,) * h.ndim) for m in range(5))
+    C = (c0 * Inugget + c1 * np.exp(-3 * h / a1) + c2 * np.exp(-3 * h / a2)) / 0.9
+    sill = (nested_para[:, 0] + nested_para[:, 1] + nested_para[:, 3]) / 0.9
+    L = pc / np.sqrt((pc ** 2 * sill).sum(axis=1))[:, None]
+    return L, C
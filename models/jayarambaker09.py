@@ -15,20 +15,16 @@ https://doi.org/10.1002/eqe.922
 import numpy as np
 
 def SpatialCorrJB09(T, h, vs30=1):
+    """
+    T and h may be scalars or arrays, broadcast against each other.
+    """
     # Use T=0 for PGA
-    if not (0 <= T <= 10.0):
+    T = np.asarray(T, dtype=float)
+    if np.any((T < 0) | (T > 10.0)):
         raise ValueError(f"T = {T} is outside the valid range [0, 10.0].")
         
     if vs30 == 1:  # vs30 clustering 
-        if T < 1:
-            b = 8.5 + 17.2 * T
-        else:  # If vs30 clustering
-            b = 22.0 + 3.7 * T
+        b = np.where(T < 1, 8.5 + 17.2 * T, 22.0 + 3.7 * T)
     elif vs30 == 2:
-        if T < 1:
-            b = 40.7 - 15.0 * T
-        else:
-            b = 22.0 + 3.7 * T
-    return np.exp(-(3 * h) / b)
-
-
+        b = np.where(T < 1, 40.7 - 15.0 * T, 22.0 + 3.7 * T)
+    return np.exp(-(3 * np.asarray(h)) / b)[()]
@@ -0,0 +1,165 @@
+"""
+Precomputed period grid of the MAO26 model.
+
+Saavg sub-periods (np.linspace(0.2T, 2.0T, 10)) rarely fall on the tabulated periods,
+so most MAO26 calls interpolate the nested parameters and PCs. An InterpolationGrid
+resolves them once for every pair of periods of a user-chosen grid, and stores them
+as dense tensors, so queries on the grid are answered by array indexing:
+
+    grid = InterpolationGrid(np.linspace(0.02, 0.2, 10))  # e.g. the sub-periods of Saavg2(0.1)
+    use_interpolation_grid(grid)
+"""
+import numpy as np
+
+from . import monteiroEtAl26
+from .monteiroEtAl26 import (extract_prefix_period, get_pair_coefficients, get_sill,
+                             CrossSpatialCorrMAO26)
+
+# Maximum number of nested structures (principal components) of a pair
+MAX_COMPONENTS = 2
+DATABASE_FLAGS = {
+    "non_cluster": dict(cluster=0),
+    "cluster_vs30_low": dict(cluster=1, vs30=1),
+    "cluster_vs30_high": dict(cluster=1, vs30=2),
+}
+
+
+class InterpolationGrid:
+    """
+    Nested-structure coefficients of MAO26 for every pair of `periods` of one IM type.
+
+    Args:
+        periods (array): Grid periods [s].
+        database (str): 'non_cluster', 'cluster_vs30_low' or 'cluster_vs30_high'.
+        im_type (str): IM prefix of both IMs, e.g. 'Sa'.
+        tolerance (float): Queries within this distance [s] of a grid period are
+            answered with that grid period.
+    """
+
+    def __init__(self, periods, database="non_cluster", im_type="Sa", tolerance=1e-9):
+        if database not in DATABASE_FLAGS:
+            raise ValueError(f"Unknown database '{database}'.")
+        self.periods = np.unique(np.asarray(periods, dtype=float))
+        self.database = database
+        self.im_type = im_type
+        self.tolerance = tolerance
+
+        n = len(self.periods)
+        names = [f"{im_type}({t})" for t in self.periods]
+        # Padded structures have zero weight (and unit ranges, to avoid dividing by zero)
+        self.weights = np.zeros((n, n, MAX_COMPONENTS))
+        self.coefficients = np.zeros((n, n, MAX_COMPONENTS, 5))
+        self.coefficients[..., [2, 4]] = 1.0
+        self.sills = np.array([get_sill(name, database) for name in names])
+
+        for i in range(n):
+            for j in range(i, n):
+                weights, coefficients = get_pair_coefficients(names[i], names[j], database)
+                k = len(weights)
+                for a, b in [(i, j), (j, i)]:
+                    self.weights[a, b, :k] = weights
+                    self.coefficients[a, b, :k] = coefficients
+
+    def find(self, period):
+        """
+        Returns the index of the grid period of `period`, or None if it is off the grid.
+        """
+        k = np.abs(self.periods - period).argmin()
+        if abs(self.periods[k] - period) > self.tolerance:
+            return None
+        return int(k)
+
+    def find_pair(self, im1, im2):
+        """
+        Returns the grid indices (i, j) of a pair of IMs, or None if it is not on the grid.
+        """
+        p1, t1 = extract_prefix_period(im1)
+        p2, t2 = extract_prefix_period(im2)
+        if p1 != self.im_type or p2 != self.im_type:
+            return None
+        i, j = self.find(t1), self.find(t2)
+        if i is None or j is None:
+            return None
+        return i, j
+
+    def correlation_tensor(self, h):
+        """
+        Correlations of every pair of grid periods, array (n_periods, n_periods, *h.shape).
+        """
+        h = np.asarray(h, dtype=float)
+        expand = (slice(None),) * 2 + (None,) * h.ndim
+        C_h = 0.0
+        for k in range(MAX_COMPONENTS):
+            c0, c1, a1, c2, a2 = (self.coefficients[:, :, k, m][expand] for m in range(5))
+            C_h += self.weights[:, :, k][expand] * (
+                c0 * (h == 0) + c1 * np.exp(-3 * h / a1) + c2 * np.exp(-3 * h / a2))
+        return C_h / np.sqrt(np.outer(self.sills, self.sills))[expand]
+
+    def interpolation_error(self, query_periods=None, h=None):
+        """
+        Compares the correlations returned with the grid in use (queries within `tolerance`
+        of grid periods answered from the grid, the others interpolated per call) against
+        the per-call interpolation of MAO26, at held-out periods.
+
+        Args:
+            query_periods (array, optional): Defaults to the midpoints of the grid periods.
+            h (array, optional): Separation distances [km]. Defaults to 0-150 km every 1 km.
+
+        Returns:
+            dict: Maximum and mean absolute error of the correlations, and the fraction
+                of the pairs answered from the grid.
+        """
+        if query_periods is None:
+            query_periods = (self.periods[1:] + self.periods[:-1]) / 2
+        h = np.linspace(0, 150, 151) if h is None else np.asarray(h, dtype=float)
+        names = [f"{self.im_type}({t})" for t in np.asarray(query_periods, dtype=float)]
+        pairs = [(name1, name2) for name1 in names for name2 in names]
+        flags = DATABASE_FLAGS[self.database]
+
+        previous = monteiroEtAl26.interpolation_grids.get(self.database)
+        try:
+            use_interpolation_grid(self)
+            with_grid = np.concatenate([CrossSpatialCorrMAO26(im1, im2, h, **flags) for im1, im2 in pairs])
+            monteiroEtAl26.interpolation_grids.pop(self.database)
+            per_call = np.concatenate([CrossSpatialCorrMAO26(im1, im2, h, **flags) for im1, im2 in pairs])
+        finally:
+            if previous is not None:
+                monteiroEtAl26.interpolation_grids[self.database] = previous
+            else:
+                monteiroEtAl26.interpolation_grids.pop(self.database, None)
+
+        errors = np.abs(with_grid - per_call)
+        on_grid = np.mean([self.find_pair(im1, im2) is not None for im1, im2 in pairs])
+        report = {'max_abs_error': errors.max(), 'mean_abs_error': errors.mean(), 'grid_fraction': on_grid}
+        print(f"MAO26 grid interpolation error ({self.database}): "
+              f"max {report['max_abs_error']:.2e}, mean {report['mean_abs_error']:.2e}, "
+              f"{100 * on_grid:.0f}% of the pairs from the grid")
+        return report
+
+    def save(self, path):
+        np.savez(path, periods=self.periods, weights=self.weights, coefficients=self.coefficients,
+                 sills=self.sills, database=self.database, im_type=self.im_type, tolerance=self.tolerance)
+
+
+def load_interpolation_grid(path):
+    """
+    Loads a grid saved with InterpolationGrid.save, without recomputing it.
+    """
+    data = np.load(path)
+    grid = InterpolationGrid.__new__(InterpolationGrid)
+    grid.periods, grid.weights = data['periods'], data['weights']
+    grid.coefficients, grid.sills = data['coefficients'], data['sills']
+    grid.database, grid.im_type = str(data['database']), str(data['im_type'])
+    grid.tolerance = float(data['tolerance'])
+    return grid
+
+
+def use_interpolation_grid(grid):
+    """
+    Makes CrossSpatialCorrMAO26 answer the queries on the grid periods from `grid`.
+    """
+    monteiroEtAl26.interpolation_grids[grid.database] = grid
+
+
+def clear_interpolation_grids():
+    monteiroEtAl26.interpolation_grids.clear()
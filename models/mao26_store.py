@@ -0,0 +1,168 @@
+"""
+Consolidated parameter store of the MAO26 model.
+
+The nested-structure parameters (model_parameters/) and PCA coefficients (PCA_coeff/)
+of the three databases (non_cluster, cluster_vs30_low, cluster_vs30_high) are compiled
+into a single binary file, so the model reads a memory map instead of opening and
+parsing a small CSV on every lookup.
+
+File layout:
+    8 bytes     little-endian uint64, length of the JSON header
+    header      JSON {"columns": [[names], ...],
+                      "index": {"<relative csv path>": [offset, n_rows, columns_id]}}
+                padded with spaces to a multiple of 8 bytes
+    data        float64 values of every table (row-major), offsets in values
+
+Build it once (and again whenever the CSVs change) with:
+    python -c "from models.mao26_store import build_parameter_store; build_parameter_store()"
+"""
+import json
+import struct
+import threading
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from collections import OrderedDict, namedtuple
+
+my_path = Path(__file__).parent
+
+STORE_PATH = my_path / "mao26_parameters.bin"
+TABLE_FOLDERS = ["model_parameters", "PCA_coeff"]
+DATABASES = ["non_cluster", "cluster_vs30_low", "cluster_vs30_high"]
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+def build_parameter_store(output_path: Path = STORE_PATH):
+    """
+    Compiles every MAO26 CSV into the binary store at `output_path`.
+    """
+    columns, index, blocks = [], {}, []
+    offset = 0
+    for folder in TABLE_FOLDERS:
+        for database in DATABASES:
+            for csv_path in sorted((my_path / folder / database).glob("*/*.csv")):
+                df = pd.read_csv(csv_path)
+                names = list(df.columns)
+                if names not in columns:
+                    columns.append(names)
+                values = df.to_numpy(dtype=float).ravel()
+                index[csv_path.relative_to(my_path).as_posix()] = [offset, len(df), columns.index(names)]
+                blocks.append(values)
+                offset += len(values)
+
+    header = json.dumps({"columns": columns, "index": index}).encode()
+    header += b" " * (-len(header) % 8)
+
+    tmp_path = output_path.with_name(f"{output_path.name}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        f.write(np.concatenate(blocks).astype("<f8").tobytes())
+    tmp_path.replace(output_path)
+    print(f"MAO26 parameter store saved: {output_path.name} ({len(index)} tables)")
+    return output_path
+
+
+# Opened stores: {store_path: (modification time, (columns, index, data))}
+_open_stores = {}
+
+
+def open_parameter_store(store_path: Path = STORE_PATH):
+    """
+    Returns (columns, index, data) of the store, with `data` memory-mapped,
+    or None if the store has not been built.
+
+    Only stores that exist are kept open, keyed by their modification time, so a store
+    built (or rebuilt) after the first lookup is picked up.
+    """
+    try:
+        mtime = store_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _open_stores.get(store_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(store_path, "rb") as f:
+        header_length = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_length))
+    data = np.memmap(store_path, dtype="<f8", mode="r", offset=8 + header_length)
+    store = header["columns"], header["index"], data
+    _open_stores[store_path] = (mtime, store)
+    return store
+
+
+def read_table(path: Path):
+    """
+    Returns the MAO26 table of a CSV path (under models/) as a DataFrame, or None
+    if it does not exist. Reads the store when it has been built, the CSV otherwise.
+    """
+    store = open_parameter_store()
+    if store is None:
+        return pd.read_csv(path) if path.exists() else None
+
+    columns, index, data = store
+    try:
+        key = path.relative_to(my_path).as_posix()
+    except ValueError:
+        return None
+    if key not in index:
+        return None
+    offset, n_rows, columns_id = index[key]
+    names = columns[columns_id]
+    values = np.array(data[offset:offset + n_rows * len(names)]).reshape(n_rows, len(names))
+    return pd.DataFrame(values, columns=names)
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe least-recently-used cache of computed values, with
+    hit/miss statistics (as functools.lru_cache) and a resizable bound.
+    """
+
+    def __init__(self, maxsize=4096):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+
+    def get(self, key, compute):
+        """
+        Returns the cached value of `key`, computing it with `compute()` on a miss.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            self._evict()
+        return value
+
+    def _evict(self):
+        while self.maxsize is not None and len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def resize(self, maxsize):
+        """
+        Changes the bound (None for unbounded), evicting the least recently used entries.
+        """
+        if maxsize is not None and maxsize < 0:
+            raise ValueError("maxsize must be >= 0 or None.")
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
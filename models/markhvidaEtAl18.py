@@ -13,7 +13,6 @@ https://doi.org/10.1002/eqe.3007
 
 
 import numpy as np
-from scipy.interpolate import interp1d
 
 T_list = np.array([0.01, 0.02, 0.03, 0.05, 0.075,
                    0.1, 0.15, 0.2, 0.25, 0.3, 0.4,
@@ -49,22 +48,36 @@ nested_para = np.array([
     [0.31, 0.0001, 0.0001, 0.0001, 0.0001],
 ])
 
-# Interpolators for PCs
-pcs_interp = [interp1d(T_list, pcs[:, i], kind='linear',
-                       fill_value="extrapolate") for i in range(5)]
+
+def interpolate_pcs(T):
+    """
+    Linearly interpolated (and extrapolated) PCs of the periods T, array (*T.shape, 5).
+    All periods and PCs are interpolated at once, with the same arithmetic as
+    scipy's interp1d(kind='linear', fill_value='extrapolate').
+    """
+    T = np.asarray(T, dtype=float)
+    hi = np.clip(np.searchsorted(T_list, T), 1, len(T_list) - 1)
+    lo = hi - 1
+    slope = (pcs[hi] - pcs[lo]) / (T_list[hi] - T_list[lo])[..., None]
+    return slope * (T - T_list[lo])[..., None] + pcs[lo]
 
 
 def get_pc(T):
-    return np.array([f(T) for f in pcs_interp])
+    # PCs along the first axis, array (5, *T.shape)
+    return np.moveaxis(interpolate_pcs(T), -1, 0)
 
 
 def CrossSpatialCorrMCB18(T1, T2, h):
+    """
+    T1, T2 and h may be scalars or arrays, broadcast against each other.
+    """
     # Interpolated PCs
     pc1 = get_pc(T1)
     pc2 = get_pc(T2)
+    h = np.asarray(h, dtype=float)
 
     # Nugget
-    Inugget = 1 if h == 0 else 0
+    Inugget = (h == 0) * 1
 
     # Cross-covariance
     C_h = 0.0
@@ -86,3 +99,22 @@ def CrossSpatialCorrMCB18(T1, T2, h):
 
     return C_h_other
 
+
+def CoregionalizationTermsMCB18(T, h):
+    """
+    Linear model of coregionalization form of the model, in which all periods share
+    the nested structures: rho_ij(h) = sum_k L_ik * L_jk * C_k(h).
+
+    Returns:
+        L (np.ndarray): Normalized PC loadings of the periods T, array (n_T, 5).
+        C (np.ndarray): Covariance of each nested structure at h, array (5, *h.shape).
+    """
+    pc = interpolate_pcs(np.atleast_1d(np.asarray(T, dtype=float)))
+    h = np.asarray(h, dtype=float)
+    Inugget = (h == 0) * 1
+
+    c0, c1, a1, c2, a2 = (nested_para[:, m].reshape((-1,) + (1,) * h.ndim) for m in range(5))
+    C = (c0 * Inugget + c1 * np.exp(-3 * h / a1) + c2 * np.exp(-3 * h / a2)) / 0.95
+    sill = (nested_para[:, 0] + nested_para[:, 1] + nested_para[:, 3]) / 0.95
+    L = pc / np.sqrt((pc ** 2 * sill).sum(axis=1))[:, None]
+    return L, C
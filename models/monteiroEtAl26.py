@@ -3,12 +3,21 @@ import pandas as pd
 import os
 from pathlib import Path
 
+from .mao26_store import read_table, LRUCache
+
 my_path = Path(__file__).parent
 
 sa_periods = np.array([0.01, 0.05, 0.075, 0.1, 0.2, 0.3, 0.4, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 4.0, 5.0])
 not_sa_periods = np.array([0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.6, 0.75, 0.8, 0.9, 1.0, 1.2, 1.5, 2.0, 2.5, 3.0, 4.0])
 ims_priority = ['Sa', 'Saavg2', 'Saavg3', 'FIV3', 'PGA', 'PGV']
 
+# Process-wide cache of the nested parameters and PCs of each (im1, im2, database),
+# read from the tables or interpolated
+coefficient_cache = LRUCache(maxsize=4096)
+
+# Precomputed period grids of each database (see models/mao26_grid.py)
+interpolation_grids = {}
+
 
 # Function that extract the prefix and the period. E.g., Sa(0.01), "Sa" and "0.01" 
 def extract_prefix_period(im):
@@ -78,8 +87,9 @@ def interpolate_parameters(im1, im2, database):
         folder_name = f"{p1}_{p2}"
         file_name = f"{p1}_{p2}.csv"   # e.g., PGA_PGV.csv
         file_path = my_path / "model_parameters" / database / folder_name / file_name
-        if file_path.exists():
-            return pd.read_csv(file_path)
+        df = read_table(file_path)
+        if df is not None:
+            return df
         else:
             raise FileNotFoundError(f"File not found for non-period IMs: {file_path}")
 
@@ -92,8 +102,9 @@ def interpolate_parameters(im1, im2, database):
             file_name = f"{t1}_{p2}.csv"   # e.g. 0.2_PGV.csv
 
         file_path = my_path / "model_parameters" / database / folder_name / file_name
-        if file_path.exists():
-            return pd.read_csv(file_path)
+        df = read_table(file_path)
+        if df is not None:
+            return df
 
 
     def get_surrounding_periods(p, t):
@@ -121,15 +132,19 @@ def interpolate_parameters(im1, im2, database):
             fname = f"{t1_val}_{t2_val}.csv"  # both have periods
 
         path = my_path / "model_parameters" / database / folder / fname
-        return pd.read_csv(path)
+        df = read_table(path)
+        if df is None:
+            raise FileNotFoundError(f"File not found: {path}")
+        return df
 
 
     # Check if full file already exists
     folder_name = f"{p1}_{p2}"
     file_name = f"{t1}_{t2}.csv"
     file_path = my_path / f"model_parameters"/ database / folder_name / file_name
-    if file_path.exists():
-        return pd.read_csv(file_path)
+    df = read_table(file_path)
+    if df is not None:
+        return df
 
     # Get surrounding periods
     t1_below, t1_above, t1_exact = get_surrounding_periods(p1, t1)
@@ -184,8 +199,9 @@ def interpolate_pc(im1, im2, value, database):
         folder_name = f"{p1}_{p2}"
         file_name = f"{p1}_{p2}.csv"   # e.g., PGA_PGV.csv
         file_path = my_path / "PCA_coeff" / database / folder_name / file_name
-        if file_path.exists():
-            return pd.read_csv(file_path)
+        df = read_table(file_path)
+        if df is not None:
+            return df
         else:
             raise FileNotFoundError(f"File not found for non-period IMs: {file_path}")
         
@@ -198,8 +214,9 @@ def interpolate_pc(im1, im2, value, database):
             file_name = f"{t1}_{p2}.csv"   # e.g. 0.2_PGV.csv
 
         file_path = my_path / "PCA_coeff"/ database / folder_name / file_name
-        if file_path.exists():
-            return pd.read_csv(file_path)
+        df = read_table(file_path)
+        if df is not None:
+            return df
 
 
 
@@ -228,14 +245,18 @@ def interpolate_pc(im1, im2, value, database):
             fname = f"{t1_val}_{t2_val}.csv"  # both have periods
 
         path = my_path / "PCA_coeff" / database / folder / fname
-        return pd.read_csv(path)
+        df = read_table(path)
+        if df is None:
+            raise FileNotFoundError(f"File not found: {path}")
+        return df
 
     folder = "PCA_coeff"
     folder_name = f"{p1}_{p2}"
     file_name = f"{t1}_{t2}.csv"
     full_path = my_path / folder / database /folder_name / file_name
-    if full_path.exists():
-        return pd.read_csv(full_path)
+    df = read_table(full_path)
+    if df is not None:
+        return df
 
     t1_below, t1_above, t1_exact = get_surrounding_periods(p1, t1)
     t2_below, t2_above, t2_exact = get_surrounding_periods(p2, t2)
@@ -362,8 +383,8 @@ def read_params_file(im1, im2, database):
     filename = f"{t1}_{t2}.csv"
     file_path = my_path / "model_parameters" / database / folder_name / filename
     
-    if file_path.exists():
-        df = pd.read_csv(file_path)
+    df = read_table(file_path)
+    if df is not None:
         df = df.select_dtypes(include=[np.number])
         return df.to_numpy(dtype=float)
     return None
@@ -375,30 +396,111 @@ def read_pc_file(im1, im2, database):
     p2, t2 = extract_prefix_period(im2)
     folder_name = f"{p1}_{p2}"
     filename = f"{t1}_{t2}.csv"
-    path = my_path / f" PCA_coeff" / database / folder_name / filename
-    if path.exists():
-        return pd.read_csv(path).to_numpy(dtype=float)  # <-- Convert to NumPy here
+    path = my_path / "PCA_coeff" / database / folder_name / filename
+    df = read_table(path)
+    if df is not None:
+        return df.to_numpy(dtype=float)  # <-- Convert to NumPy here
     return None
 
 
-def get_pc(im1, im2, value, database):
-    im1, im2 = sort_im_pair(im1, im2)
+def read_only(values):
+    # Cached arrays are shared between callers
+    values = np.array(values, dtype=float)
+    values.flags.writeable = False
+    return values
+
+
+def load_pc(im1, im2, database):
     data = read_pc_file(im1, im2, database)
     if data is not None:
         return data  # already a NumPy array
-    interpolated = interpolate_pc(im1, im2, value, database)
+    interpolated = interpolate_pc(im1, im2, None, database)
     return interpolated.to_numpy(dtype=float) if isinstance(interpolated, pd.DataFrame) else interpolated
 
 
-
-def get_nested_parameters(im1, im2, database):
+def get_pc(im1, im2, value, database):
     im1, im2 = sort_im_pair(im1, im2)
+    return coefficient_cache.get(("pc", im1, im2, database),
+                                 lambda: read_only(load_pc(im1, im2, database)))
+
+
+def load_nested_parameters(im1, im2, database):
     data = read_params_file(im1, im2, database)
     if data is not None:
         return data
     return interpolate_parameters(im1, im2, database)
 
 
+def get_nested_parameters(im1, im2, database):
+    im1, im2 = sort_im_pair(im1, im2)
+    return coefficient_cache.get(("nested", im1, im2, database),
+                                 lambda: read_only(load_nested_parameters(im1, im2, database)))
+
+
+def mao26_cache_info():
+    """
+    Returns the (hits, misses, maxsize, currsize) of the coefficient cache.
+    """
+    return coefficient_cache.info()
+
+
+def clear_mao26_cache():
+    coefficient_cache.clear()
+
+
+def resize_mao26_cache(maxsize):
+    """
+    Sets the maximum number of cached coefficient tables (None for unbounded).
+    """
+    coefficient_cache.resize(maxsize)
+
+
+
+def get_pair_coefficients(im1, im2, database):
+    """
+    Returns the weights pc1 * pc2 and the (c0, c1, a1, c2, a2) coefficients of each
+    nested structure of the (sorted) pair im1-im2.
+    """
+    nested_para = np.asarray(get_nested_parameters(im1, im2, database))
+
+    pc_all = get_pc(im1, im2, None, database)  # Get full array
+    pc1 = pc_all[:, 0]
+    if im1 != im2 and pc_all.shape[1] > 1:
+        pc2 = pc_all[:, 1]
+    else:
+        pc2 = pc1
+    n = len(nested_para)
+    return pc1[:n] * pc2[:n], nested_para[:, 1:]
+
+
+def get_sill(im, database):
+    """
+    Returns the covariance at h = 0 of the im with itself.
+    """
+    C_zero = 0.0
+    nested_para = np.asarray(get_nested_parameters(im, im, database))
+    pc1 = get_pc(im, im, None, database)[:, 0]  # First and only principal component =1
+    for i in range(len(nested_para)):
+        _, c0i, c1i, a1i, c2i, a2i = nested_para[i]
+        C_zero += pc1 ** 2 * (c0i + c1i + c2i)
+    return np.asarray(C_zero).item()
+
+
+def nested_covariance(weights, coefficients, h):
+    """
+    Cross-covariance sum_i w_i * (c0i * Inugget + c1i * exp(-3h/a1i) + c2i * exp(-3h/a2i))
+    for an array of distances h.
+    """
+    Inugget = (h == 0) * 1
+    C_h = 0.0
+    for i in range(len(coefficients)):
+        c0i, c1i, a1i, c2i, a2i = coefficients[i]
+        Cij_h = (c0i * Inugget + c1i * np.exp(-3 * h / a1i) +
+                 c2i * np.exp(-3 * h / a2i))
+        C_h += weights[i] * Cij_h
+    return C_h
+
+
 def CrossSpatialCorrMAO26(IM1, IM2, h, cluster=0, vs30=None):
     """
     MAO2025 function
@@ -406,7 +508,8 @@ def CrossSpatialCorrMAO26(IM1, IM2, h, cluster=0, vs30=None):
     Arguments:
         IM1 (float): First intensity measure (e.g., ground motion parameter).
         IM2 (float): Second intensity measure.
-        h (float): Depth or scaling parameter.
+        h (float or np.ndarray): Separation distance(s) [km], e.g. a vector of bins
+            or a 2-D site-to-site distance matrix.
         cluster (int, optional): Clustering flag. Defaults to 0.
             - 0 → use "non_cluster" database (ignores vs30).
             - 1 → use "cluster" database (requires vs30).
@@ -416,8 +519,8 @@ def CrossSpatialCorrMAO26(IM1, IM2, h, cluster=0, vs30=None):
             If cluster=0, this is ignored.
     
     Returns:
-        corr (float): Correlation value retrieved from the chosen database,
-                      for the given IM1, IM2, and distance h.
+        corr (float or np.ndarray): Correlation value retrieved from the chosen database,
+                      for the given IM1, IM2, and distance h (same shape as h).
     """
     
     if cluster == 0:
@@ -439,60 +542,21 @@ def CrossSpatialCorrMAO26(IM1, IM2, h, cluster=0, vs30=None):
     IM1, IM2 = sort_im_pair(IM1, IM2)
 
     
-    nested_para = np.asarray(get_nested_parameters(IM1, IM2, database))
-    
-    pc_all = get_pc(IM1, IM2, None, database)  # Get full array
-    pc1 = pc_all[:, 0]
-    if IM1 != IM2 and pc_all.shape[1] > 1:
-        pc2 = pc_all[:, 1]
+    # Coefficients are resolved once, for all the distances, from the
+    # precomputed grid of the database if it contains both periods
+    grid = interpolation_grids.get(database)
+    indices = grid.find_pair(IM1, IM2) if grid is not None else None
+    if indices is not None:
+        weights, coefficients = grid.weights[indices], grid.coefficients[indices]
+        C_zero1, C_zero2 = grid.sills[indices[0]], grid.sills[indices[1]]
     else:
-        pc2 = pc1
-        
-    
-    Inugget = 1 if h == 0 else 0
-    sill = C_h = Cii_0 = Cjj_0 =0.0
-    for i in range(len(nested_para)):
-        _, c0i, c1i, a1i, c2i, a2i = nested_para[i]
-        Cij_h = (c0i * Inugget + c1i * np.exp(-3 * h / a1i) +
-                 c2i * np.exp(-3 * h / a2i))
-        # semiv_ij_h = (c0i * (1-Inugget) + c1i * (1-np.exp(-3 * h / a1i)) +
-        #          c2i *(1-np.exp(-3 * h / a2i)))
-        silli = c0i + c1i + c2i
-
-        sill += pc1[i] * pc2[i] * silli
-        C_h += pc1[i] * pc2[i] * Cij_h
-        
-        
-        
-    # For the IM1 individually
-    nested_para1 = np.asarray(get_nested_parameters(IM1, IM1, database))
-    pc_all1 = get_pc(IM1, IM1, None, database)  # Get full array
-    pc1_1 = pc_all1[:, 0]  # First and only principal component =1
-    
-    C_zero1 = 0.0
-    for i in range(len(nested_para1)):
-            _, c0i, c1i, a1i, c2i, a2i = nested_para1[i]
-            Ci1_h_1 = (c0i * Inugget + c1i * np.exp(-3 * h / a1i) +
-                    c2i * np.exp(-3 * h / a2i))
-            silli_1 = c0i + c1i + c2i
-            C_zero1 += pc1_1 ** 2 * silli_1
-
-            
-    # For the IM2 individually
-    nested_para2 = np.asarray(get_nested_parameters(IM2, IM2, database))
-    pc_all2 = get_pc(IM2, IM2, None, database)  # Get full array
-    pc1_2 = pc_all2[:, 0]  # First and only principal component =1
-
-    C_zero2 = 0.0
-    for i in range(len(nested_para2)):
-            _, c0i, c1i, a1i, c2i, a2i = nested_para2[i]
-            Ci1_h_2 = (c0i * Inugget + c1i * np.exp(-3 * h / a1i) +
-                    c2i * np.exp(-3 * h / a2i))
-            silli_2 = c0i + c1i + c2i
-            C_zero2 += pc1_2 ** 2 * silli_2
-
+        weights, coefficients = get_pair_coefficients(IM1, IM2, database)
+        C_zero1, C_zero2 = get_sill(IM1, database), get_sill(IM2, database)
 
+    h_array = np.asarray(h, dtype=float)
+    C_h = nested_covariance(weights, coefficients, h_array)
     corr = C_h / np.sqrt(C_zero1 * C_zero2)
     
-    return float(np.asarray(corr).item())
-
+    if h_array.ndim == 0:
+        return float(corr)
+    return corr
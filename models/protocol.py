@@ -0,0 +1,191 @@
+"""
+Common interface of the correlation models.
+
+Every model implements `correlation(ims_a, ims_b, h)`, where `ims_a` and `ims_b` are
+sequences of IMs and `h` is an array of separation distances [km], and returns an
+array (len(ims_a), len(ims_b), *h.shape). IMs can be given as IM descriptors,
+labels (e.g. 'Sa(0.3)', 'SA(0.3)', 'PGA') or Sa periods in seconds:
+
+    model = get_model('LB13')
+    rho = model.correlation(periods, periods, np.linspace(0, 150, 151))
+"""
+import numpy as np
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+from .lothbaker13 import CrossSpatialCorrLB13
+from .markhvidaEtAl18 import CrossSpatialCorrMCB18, CoregionalizationTermsMCB18
+from .duning21 import CrossSpatialCorrDN21, CoregionalizationTermsDN21
+from .bakerjayaram08 import corrBJ08
+from .jayarambaker09 import SpatialCorrJB09
+
+# IM descriptor, e.g. IM('Sa', 0.3) or IM('PGA', None)
+IM = namedtuple('IM', ['prefix', 'period'])
+
+
+def to_im(im):
+    """
+    Converts an IM label, an Sa period or an IM descriptor to an IM descriptor.
+    """
+    if isinstance(im, IM):
+        return im
+    if isinstance(im, str):
+        if '(' in im and im.endswith(')'):
+            prefix, period = im[:-1].split('(')
+            # DN21 labels Sa as 'SA'
+            return IM('Sa' if prefix == 'SA' else prefix, float(period))
+        return IM(im, None)
+    return IM('Sa', float(im))
+
+
+def to_ims(ims):
+    # A single IM (an IM descriptor is also a tuple) or a sequence of IMs
+    if isinstance(ims, IM) or not isinstance(ims, (list, tuple, np.ndarray)):
+        ims = [ims]
+    return [to_im(im) for im in (np.ravel(ims) if isinstance(ims, np.ndarray) else ims)]
+
+
+class CorrelationModel(ABC):
+    """
+    Base class of the models. Subclasses implement `sa_correlation` (Sa periods at
+    every h: arrays broadcast against h if the model is `vectorized`, scalars otherwise)
+    and, if they support other IMs, `pair_correlation` (one pair of IMs at every h).
+    """
+    name = None
+    supported_ims = ('Sa',)
+    # Whether every pair of Sa periods is evaluated in one call
+    vectorized = True
+
+    def correlation(self, ims_a, ims_b, h):
+        ims_a, ims_b = to_ims(ims_a), to_ims(ims_b)
+        h = np.asarray(h, dtype=float)
+        for im in ims_a + ims_b:
+            if im.prefix not in self.supported_ims:
+                raise ValueError(f"{self.name} does not support {im.prefix}.")
+
+        if self.vectorized and all(im.prefix == 'Sa' for im in ims_a + ims_b):
+            expand = (None,) * h.ndim
+            T_a = np.array([im.period for im in ims_a])[(slice(None), None) + expand]
+            T_b = np.array([im.period for im in ims_b])[(None, slice(None)) + expand]
+            return np.broadcast_to(self.sa_correlation(T_a, T_b, h[None, None]),
+                                   (len(ims_a), len(ims_b)) + h.shape).copy()
+
+        rho = np.empty((len(ims_a), len(ims_b)) + h.shape)
+        for i, im_a in enumerate(ims_a):
+            for j, im_b in enumerate(ims_b):
+                rho[i, j] = self.pair_correlation(im_a, im_b, h)
+        return rho
+
+    @abstractmethod
+    def sa_correlation(self, T1, T2, h):
+        pass
+
+    def pair_correlation(self, im_a, im_b, h):
+        return self.sa_correlation(im_a.period, im_b.period, h)
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+
+class ModelLB13(CorrelationModel):
+    name = 'LB13'
+
+    def sa_correlation(self, T1, T2, h):
+        return CrossSpatialCorrLB13(T1, T2, h)
+
+
+class ModelMCB18(CorrelationModel):
+    name = 'MCB18'
+
+    def sa_correlation(self, T1, T2, h):
+        return CrossSpatialCorrMCB18(T1, T2, h)
+
+    def coregionalization(self, ims, h):
+        """
+        (L, C) of the linear model of coregionalization, see CoregionalizationTermsMCB18.
+        """
+        return CoregionalizationTermsMCB18([im.period for im in to_ims(ims)], h)
+
+
+class ModelDN21(CorrelationModel):
+    name = 'DN21'
+    supported_ims = ('Sa', 'PGA', 'PGV', 'DS575', 'DS595')
+
+    def sa_correlation(self, T1, T2, h):
+        return CrossSpatialCorrDN21(T1, T2, h)
+
+    def pair_correlation(self, im_a, im_b, h):
+        labels = [f"SA({im.period})" if im.prefix == 'Sa' else im.prefix for im in (im_a, im_b)]
+        return CrossSpatialCorrDN21(*labels, h)
+
+    def coregionalization(self, ims, h):
+        """
+        (L, C) of the linear model of coregionalization, see CoregionalizationTermsDN21.
+        """
+        return CoregionalizationTermsDN21([im.period for im in to_ims(ims)], h)
+
+
+class ModelMAO26(CorrelationModel):
+    """
+    Args:
+        cluster (int): 0 for the non_cluster database, 1 for the cluster databases.
+        vs30 (int, optional): 1 (low) or 2 (high) Vs30, if cluster=1.
+    """
+    name = 'MAO26'
+    supported_ims = ('Sa', 'Saavg2', 'Saavg3', 'FIV3', 'PGA', 'PGV')
+    # Nested structures are specific to each pair of IMs
+    vectorized = False
+
+    def __init__(self, cluster=0, vs30=None):
+        self.cluster = cluster
+        self.vs30 = vs30
+
+    def sa_correlation(self, T1, T2, h):
+        return self.pair_correlation(IM('Sa', T1), IM('Sa', T2), h)
+
+    def pair_correlation(self, im_a, im_b, h):
+        # Imported on first use, as the model loads pandas
+        from .monteiroEtAl26 import CrossSpatialCorrMAO26
+        labels = [im.prefix if im.period is None else f"{im.prefix}({im.period})" for im in (im_a, im_b)]
+        return CrossSpatialCorrMAO26(*labels, h, cluster=self.cluster, vs30=self.vs30)
+
+    def __repr__(self):
+        return f"ModelMAO26(cluster={self.cluster}, vs30={self.vs30})"
+
+
+class ModelMarkov(CorrelationModel):
+    """
+    Markov-type model: non-spatial correlation (BJ08) times the spatial correlation
+    (JB09) of the longer period.
+
+    Args:
+        vs30 (int): Vs30 case of JB09, 1 (clustered) or 2.
+    """
+    name = 'Markov'
+
+    def __init__(self, vs30=1):
+        self.vs30 = vs30
+
+    def sa_correlation(self, T1, T2, h):
+        return corrBJ08(T1, T2) * SpatialCorrJB09(np.maximum(T1, T2), h, self.vs30)
+
+    def __repr__(self):
+        return f"ModelMarkov(vs30={self.vs30})"
+
+
+MODELS = {
+    'LB13': ModelLB13,
+    'MCB18': ModelMCB18,
+    'DN21': ModelDN21,
+    'MAO26': ModelMAO26,
+    'Markov': ModelMarkov,
+}
+
+
+def get_model(name, **kwargs):
+    """
+    Returns the model `name` (a key of MODELS), e.g. get_model('MAO26', cluster=0).
+    """
+    if name not in MODELS:
+        raise ValueError(f"Unknown model '{name}', use one of {list(MODELS)}.")
+    return MODELS[name](**kwargs)
@@ -7,38 +7,50 @@ This package contains modular utility functions used for:
 3. Final correlation synthesis
 
 Modules:
+    - flatfile.py
     - gmm_calculator.py
+    - gmm_cache.py
+    - saavg.py
+    - prediction_files.py
+    - corr_engine.py
     - stdev_and_corr.py
     - stdev_and_corr_total.py
     - correlation_final.py
     - correlation_final_total.py
+    - pipeline.py
+    - scheduler.py
+    - pair_planner.py
 """
 
-from .gmm_calculator import compute_gmm_predictions
-from .stdev_and_corr import (
-    process_stdev_combinations,
-    compute_correlations,
-    compute_numerators,
-    compute_denominators,
-)
-from .stdev_and_corr_total import (
-    process_stdev_combinations_total,
-    compute_numerators_total,
-    compute_denominators_total,
-)
-from .corr_final import compute_final_corr
-from .corr_final_total import compute_final_corr_total
+import importlib
 
-__all__ = [
-    "compute_gmm_predictions",
-    "process_stdev_combinations",
-    "compute_correlations",
-    "compute_numerators",
-    "compute_denominators",
-    "compute_final_corr",
-    "process_stdev_combinations_total",
-    "compute_correlations_total",
-    "compute_numerators_total",
-    "compute_denominators_total",
-    "compute_final_corr_total"
-]
\ No newline at end of file
+# Functions are imported from their module on first access, so e.g. the correlation
+# stages can be used without loading OpenQuake (needed only by gmm_calculator)
+EXPORTS = {
+    "compute_gmm_predictions": "gmm_calculator",
+    "compute_gmm_logic_tree": "gmm_calculator",
+    "process_stdev_combinations": "stdev_and_corr",
+    "compute_correlations": "stdev_and_corr",
+    "compute_numerators": "stdev_and_corr",
+    "compute_denominators": "stdev_and_corr",
+    "compute_final_corr": "corr_final",
+    "process_stdev_combinations_total": "stdev_and_corr_total",
+    "compute_correlations_total": "stdev_and_corr_total",
+    "compute_numerators_total": "stdev_and_corr_total",
+    "compute_denominators_total": "stdev_and_corr_total",
+    "compute_final_corr_total": "corr_final_total",
+    "run_pipeline": "pipeline",
+    "run_logic_tree": "pipeline",
+    "register_saavg": "saavg",
+    "compute_stages_parallel": "scheduler",
+    "compute_stages_planned": "pair_planner",
+}
+
+__all__ = list(EXPORTS)
+
+
+def __getattr__(name):
+    if name in EXPORTS:
+        module = importlib.import_module(f".{EXPORTS[name]}", __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
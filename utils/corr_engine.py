@@ -0,0 +1,346 @@
+"""
+Vectorized evaluation of the inter-Sa(T) spatial correlation models.
+
+Each model is evaluated on the full (Period1, Period2, Bin) grid and returned as an
+array of shape (n_periods, n_periods, n_bins), so that the numerators of the indirect
+Saavg correlation follow from broadcasting with the stdevs.
+"""
+import numpy as np
+import pandas as pd
+
+from models.protocol import ModelLB13, ModelMCB18, ModelDN21, ModelMAO26, ModelMarkov
+from .saavg import (weighted_stdevs, get_definition, get_saavg_periods,
+                    get_saavg_weights, gauss_saavg)
+
+
+# Correlation models with the common interface of models/protocol.py
+# (keys match the column suffixes of the correlation/numerator files)
+CORRELATION_MODELS = {
+    'loth': ModelLB13(),
+    'markhvida': ModelMCB18(),
+    'DuNing': ModelDN21(),
+    'vitor': ModelMAO26(cluster=0),
+    'markov': ModelMarkov(vs30=1),
+}
+
+# Spatial models with a total-residual counterpart (the total tables only have these)
+TOTAL_MODELS = ['loth', 'markhvida', 'DuNing', 'vitor']
+
+# Separation distances [km] of the correlation curves, unless others are given
+DEFAULT_BINS = np.linspace(0, 150, 151)
+
+# Maximum number of values of a correlation tensor evaluated at once (n_periods^2 * n_bins)
+MAX_TENSOR_SIZE = 2 ** 22
+
+
+def is_lmc(name):
+    # Linear models of coregionalization (all periods share the nested structures), for
+    # which sum_ij s_i s_j rho_ij(h) collapses to sum_k (sum_i s_i L_ik)^2 C_k(h)
+    return hasattr(CORRELATION_MODELS[name], 'coregionalization')
+
+
+def get_period_stdevs(stdev_df, stdev='stdev3'):
+    """
+    Returns the periods and their stdevs from a stdev_combinations DataFrame
+    (rows are the product of the periods with themselves).
+    """
+    first = stdev_df[stdev_df['Period1'] == stdev_df['Period1'].iloc[0]]
+    return first['Period2'].to_numpy(dtype=float), first[f'{stdev}_period2'].to_numpy(dtype=float)
+
+
+def iter_pair_correlations(periods, bin_values, models=None):
+    """
+    Yields (i, j, {model: rho(h)}) for every pair of periods (i, j), with each
+    model evaluated for all the distances in `bin_values` at once.
+    """
+    models = list(CORRELATION_MODELS) if models is None else models
+    for i, p1 in enumerate(periods):
+        for j, p2 in enumerate(periods):
+            yield i, j, {name: CORRELATION_MODELS[name].correlation(p1, p2, bin_values)[0, 0]
+                         for name in models}
+
+
+def compute_correlation_tensors(periods, bin_values, models=None):
+    """
+    Evaluates each correlation model for every pair of periods and every distance.
+
+    Args:
+        periods (array): Sa(T) periods.
+        bin_values (array): Separation distances [km].
+        models (list[str], optional): Keys of CORRELATION_MODELS. Defaults to all models.
+
+    Returns:
+        dict: {model: array(n_periods, n_periods, n_bins)}
+    """
+    periods = np.asarray(periods, dtype=float)
+    bin_values = np.asarray(bin_values, dtype=float)
+    models = list(CORRELATION_MODELS) if models is None else models
+
+    tensors = {name: CORRELATION_MODELS[name].correlation(periods, periods, bin_values)
+               for name in models if CORRELATION_MODELS[name].vectorized}
+    pair_models = [name for name in models if name not in tensors]
+    for name in pair_models:
+        tensors[name] = np.empty((len(periods), len(periods), len(bin_values)))
+    if pair_models:
+        for i, j, rho in iter_pair_correlations(periods, bin_values, pair_models):
+            for name in pair_models:
+                tensors[name][i, j] = rho[name]
+    return {name: tensors[name] for name in models}
+
+
+def quadratic_form(rho, stdevs):
+    """
+    s^T R(h) s for every distance of `rho` (n_periods, n_periods, n_bins), as two matrix
+    products instead of summing the (n_periods, n_periods, n_bins) products.
+    """
+    return stdevs @ np.tensordot(stdevs, rho, axes=(0, 0))
+
+
+def lmc_numerator(name, periods, stdevs, bin_values):
+    """
+    sum_ij s_i s_j rho_ij(h) of a linear model of coregionalization, in
+    O(n_periods * n_structures) per distance instead of O(n_periods^2).
+    """
+    loadings, structures = CORRELATION_MODELS[name].coregionalization(periods, bin_values)
+    return (np.asarray(stdevs, dtype=float) @ loadings) ** 2 @ structures
+
+
+def accumulate_numerators(periods, stdevs, bin_values, models=None):
+    """
+    Sums rho_ij(h) * s_i * s_j over all pairs of periods while they are evaluated,
+    so memory does not grow with the number of pairs. Linear models of
+    coregionalization use the collapsed form, and vectorized models are evaluated
+    for all pairs at once, in batches of distances reduced with quadratic_form;
+    the others are evaluated pair by pair.
+
+    Returns:
+        dict: {model: array(n_bins)}
+    """
+    periods = np.asarray(periods, dtype=float)
+    bin_values = np.asarray(bin_values, dtype=float)
+    models = list(CORRELATION_MODELS) if models is None else models
+
+    stdevs = np.asarray(stdevs, dtype=float)
+    batch_size = max(1, MAX_TENSOR_SIZE // len(periods) ** 2)
+    numerators = {}
+    for name in models:
+        model = CORRELATION_MODELS[name]
+        if is_lmc(name):
+            numerators[name] = lmc_numerator(name, periods, stdevs, bin_values)
+        elif model.vectorized:
+            numerators[name] = np.concatenate([
+                quadratic_form(model.correlation(periods, periods, bin_values[start:start + batch_size]), stdevs)
+                for start in range(0, len(bin_values), batch_size)])
+        else:
+            numerators[name] = np.zeros(len(bin_values))
+    pair_models = [name for name in models if not is_lmc(name) and not CORRELATION_MODELS[name].vectorized]
+    if pair_models:
+        for i, j, rho in iter_pair_correlations(periods, bin_values, pair_models):
+            for name in pair_models:
+                numerators[name] += rho[name] * stdevs[i] * stdevs[j]
+    return numerators
+
+
+def refine_numerators(periods, stdevs, bin_values, models=None, tolerance=1e-3, min_spacing=0.01):
+    """
+    Adaptive distance grid: starting from `bin_values` (and h = 0), each interval is
+    bisected while the correlation curve of any model, sum_ij rho_ij(h) s_i s_j
+    normalized by its value at h = 0, departs by more than `tolerance` from the linear
+    interpolation between the ends of the interval. Only the new midpoints are
+    evaluated in each pass, so the cost follows the number of points needed.
+
+    Some models jump at h = 0 (e.g. the nugget of LB13 and MAO26), so h = 0 is a point
+    of its own: the first interval is interpolated from the h -> 0+ limit of the curve.
+
+    Args:
+        periods (array): Sa(T) periods.
+        stdevs (array): Stdevs of each period.
+        bin_values (array): Initial separation distances [km], e.g. np.linspace(0, 300, 31).
+        models (list[str], optional): Keys of CORRELATION_MODELS. Defaults to all models.
+        tolerance (float): Maximum interpolation error of the correlation curves.
+        min_spacing (float): Intervals [km] shorter than this are not bisected.
+
+    Returns:
+        tuple: (refined distances, {model: array(n_bins)} of the numerators)
+    """
+    bins = np.union1d(np.asarray(bin_values, dtype=float), [0.0])
+    sums = accumulate_numerators(periods, stdevs, bins, models)
+    denominators = np.array([numerator[0] for numerator in sums.values()])[:, None]
+    # h -> 0+ limit, i.e. without the nugget
+    limits = np.array(list(accumulate_numerators(periods, stdevs, [1e-9], models).values()))
+
+    left, right = bins[:-1], bins[1:]
+    while len(left):
+        middle = (left + right) / 2
+        new_sums = accumulate_numerators(periods, stdevs, middle, models)
+
+        values = np.array(list(sums.values()))
+        left_values = values[:, np.searchsorted(bins, left)]
+        left_values[:, left == 0] = limits
+        expected = (left_values + values[:, np.searchsorted(bins, right)]) / 2
+        error = np.abs(np.array(list(new_sums.values())) - expected) / denominators
+        bins = np.concatenate([bins, middle])
+        order = np.argsort(bins, kind='stable')
+        bins = bins[order]
+        sums = {name: np.concatenate([sums[name], new_sums[name]])[order] for name in sums}
+
+        refine = (error.max(axis=0) > tolerance) & (right - left > 2 * min_spacing)
+        left, right, middle = left[refine], right[refine], middle[refine]
+        left, right = np.concatenate([left, middle]), np.concatenate([middle, right])
+    return bins, sums
+
+
+def residual_tables(periods, phi, bin_values, models=None, tau=None, rho_between=None, tolerance=None,
+                    weights=None, min_spacing=0.01):
+    """
+    Evaluates the spatial within-event correlations once, and returns from them the
+    numerators and denominators of the within-event residuals and, if `tau` and
+    `rho_between` are given, of the total residuals:
+
+        within: sum_ij rho_ij(h) * phi_i * phi_j
+        total:  sum_ij rho_between_ij * tau_i * tau_j + rho_ij(h) * phi_i * phi_j
+
+    The denominators are the same sums at h = 0. With a `tolerance`, `bin_values` is
+    only the initial grid, refined with refine_numerators.
+
+    Args:
+        periods (array): Sa(T) periods.
+        phi (array): Within-event stdevs of each period.
+        bin_values (array): Separation distances [km].
+        models (list[str], optional): Keys of CORRELATION_MODELS. Defaults to all models.
+        tau (array, optional): Between-event stdevs of each period.
+        rho_between (array, optional): (n_periods, n_periods) between-event correlations.
+        tolerance (float, optional): Tolerance of the adaptive grid. The within-event curves
+            are refined, and the total-residual curves are flatter (the between-event
+            term does not depend on h), so they meet it as well.
+        weights (array, optional): Weights of the sub-periods in ln Saavg (see utils.saavg).
+            Defaults to equal weights.
+        min_spacing (float): Shortest interval [km] of the adaptive grid.
+
+    Returns:
+        dict: {'within': (numerator_df, denominator_df), 'total': (numerator_df, denominator_df)}
+    """
+    phi, divisor = weighted_stdevs(phi, weights)
+    if tolerance is not None:
+        bin_values, sums = refine_numerators(periods, phi, bin_values, models, tolerance, min_spacing)
+    else:
+        bin_values = np.asarray(bin_values, dtype=float)
+        sums = accumulate_numerators(periods, phi, evaluation_bins(bin_values), models)
+    return tables_from_sums(bin_values, sums, divisor, tau, rho_between, weights)
+
+
+def evaluation_bins(bin_values):
+    # Evaluate h = 0 in the same pass, for the denominators
+    return bin_values if np.any(bin_values == 0) else np.append(bin_values, 0.0)
+
+
+def tables_from_sums(bin_values, sums, divisor, tau=None, rho_between=None, weights=None):
+    """
+    Numerator and denominator tables of residual_tables, from the sums of each model
+    evaluated at evaluation_bins(bin_values) with the stdevs and divisor of
+    weighted_stdevs. The total-residual tables only have the models of TOTAL_MODELS,
+    whichever other models were evaluated.
+    """
+    n_bins = len(bin_values)
+    zero = np.flatnonzero(evaluation_bins(bin_values) == 0)[0]
+
+    def tables(between, names):
+        numerator_df = pd.DataFrame({'Bin': bin_values})
+        denominator_df = pd.DataFrame(index=[0])
+        for name in names:
+            numerator = sums[name]
+            # Scale down (as in your original script)
+            numerator_df[f"numerator_{name}"] = (numerator[:n_bins] + between) / divisor
+            denominator_df[f"denominator_{name}"] = (numerator[zero] + between) / divisor
+        return numerator_df, denominator_df
+
+    results = {'within': tables(0.0, list(sums))}
+    if tau is not None:
+        tau, _ = weighted_stdevs(tau, weights)
+        numerator_df, denominator_df = tables((rho_between * np.outer(tau, tau)).sum(),
+                                              [name for name in sums if name in TOTAL_MODELS])
+        # sum_ij w_i w_j rho_between_ij
+        unit, unit_divisor = weighted_stdevs(np.ones(len(tau)), weights)
+        denominator_df.insert(0, 'Correlation_between',
+                              (rho_between * np.outer(unit, unit)).sum() / unit_divisor)
+        results['total'] = (numerator_df, denominator_df)
+    return results
+
+
+def saavg_correlation_curves(im, T, stdevs, bin_values, models=None):
+    """
+    Indirect correlation curves of Saavg(T) of the definition `im`, given the
+    within-event stdevs of its sub-periods.
+
+    Returns:
+        array(n_models, n_bins)
+    """
+    numerator_df, denominator_df = residual_tables(get_saavg_periods(im, T), stdevs, bin_values, models,
+                                                   weights=get_saavg_weights(im))['within']
+    names = [column[len("numerator_"):] for column in numerator_df.columns[1:]]
+    return np.array([numerator_df[f"numerator_{name}"] / denominator_df[f"denominator_{name}"][0]
+                     for name in names])
+
+
+def reduce_saavg(im, calibration_periods, get_stdevs, tolerance=0.01, bin_values=None, models=None,
+                 max_nodes=None):
+    """
+    Chooses the fewest Gaussian-quadrature sub-periods (see utils.saavg.gauss_saavg)
+    whose correlation curves are within `tolerance` of those of `im` at every
+    calibration period, model and distance. The number of pairs of periods to
+    evaluate drops from n^2 to n_nodes^2 for every other Saavg period of a run.
+
+    Args:
+        im (str): Reference definition, e.g. 'Saavg2'.
+        calibration_periods (list[float]): Saavg periods T where the error is measured.
+        get_stdevs (callable): get_stdevs(im, T) returns the within-event stdevs of the
+            sub-periods get_saavg_periods(im, T), e.g. from the GMM.
+        tolerance (float): Maximum absolute error of the correlations.
+        bin_values (array, optional): Separation distances [km]. Defaults to DEFAULT_BINS.
+        models (list[str], optional): Keys of CORRELATION_MODELS. Defaults to all models.
+        max_nodes (int, optional): Defaults to one less than the sub-periods of `im`.
+
+    Returns:
+        tuple: (name of the definition to use, dict with the number of sub-periods, the
+            maximum absolute error achieved and the error at each calibration period).
+            If no approximation meets the tolerance, `im` itself (with zero error).
+    """
+    bin_values = DEFAULT_BINS if bin_values is None else np.asarray(bin_values, dtype=float)
+    n_periods = get_definition(im)['n_periods']
+    max_nodes = n_periods - 1 if max_nodes is None else max_nodes
+
+    references = {T: saavg_correlation_curves(im, T, get_stdevs(im, T), bin_values, models)
+                  for T in calibration_periods}
+    for n_nodes in range(1, max_nodes + 1):
+        name = gauss_saavg(im, n_nodes)
+        period_errors = {T: np.abs(saavg_correlation_curves(name, T, get_stdevs(name, T), bin_values, models)
+                                   - reference).max() for T, reference in references.items()}
+        error = max(period_errors.values())
+        if error <= tolerance:
+            print(f"{name}: {n_nodes} sub-periods instead of {n_periods}, max abs error {error:.2e} ("
+                  + ", ".join(f"T={T:.2f}: {value:.2e}" for T, value in period_errors.items()) + ")")
+            return name, {'n_periods': n_nodes, 'max_abs_error': error, 'period_errors': period_errors}
+    print(f"No Gaussian-quadrature approximation of {im} within {tolerance:.0e}, using {im}")
+    return im, {'n_periods': n_periods, 'max_abs_error': 0.0, 'period_errors': dict.fromkeys(references, 0.0)}
+
+
+def correlation_table(periods, stdevs, bin_values, tensors):
+    """
+    Flattens the correlation tensors into the rows of a correlation_sa_*.csv file,
+    ordered by (Period1, Period2, Bin), with the numerators rho * s1 * s2.
+    """
+    n, n_bins = len(periods), len(bin_values)
+    s1s2 = np.outer(stdevs, stdevs)[:, :, None]
+
+    table = {
+        'Bin': np.tile(bin_values, n * n),
+        'Period1': np.repeat(periods, n * n_bins),
+        'Period2': np.tile(np.repeat(periods, n_bins), n),
+        'stdev3_period1': np.repeat(stdevs, n * n_bins),
+        'stdev3_period2': np.tile(np.repeat(stdevs, n_bins), n),
+    }
+    for name, rho in tensors.items():
+        table[f'Correlation_{name}'] = rho.ravel()
+    for name, rho in tensors.items():
+        table[f'numerator_{name}'] = (rho * s1s2).ravel()
+    return pd.DataFrame(table)
@@ -3,6 +3,26 @@ import pandas as pd
 import numpy as np
 
 
+def final_corr_table(numerator_df, denominator_df):
+    """
+    Normalizes the numerators of each model by its denominator.
+    """
+    # Extract single-row denominator values
+    denominators = denominator_df.iloc[0].to_dict()
+
+    # Build correlation DataFrame
+    corr_df = pd.DataFrame()
+    corr_df["Bin"] = numerator_df["Bin"]
+
+    # Compute normalized correlation for each model
+    models = [col[len("numerator_"):] for col in numerator_df.columns if col.startswith("numerator_")]
+    for model in models:
+        num_col = f"numerator_{model}"
+        denom_val = denominators[f"denominator_{model}"]
+        corr_df[f"Correlation_{model}"] = numerator_df[num_col] / (np.sqrt(denom_val) ** 2)
+    return corr_df
+
+
 def compute_final_corr(stdev_dir: Path, output_dir: Path, avgsa_periods):
     """
     Combines numerator and denominator results to compute final correlations
@@ -26,18 +46,7 @@ def compute_final_corr(stdev_dir: Path, output_dir: Path, avgsa_periods):
         numerator_df = pd.read_csv(numerator_path)
         denominator_df = pd.read_csv(denominator_path)
 
-        # Extract single-row denominator values
-        denominators = denominator_df.iloc[0].to_dict()
-
-        # Build correlation DataFrame
-        corr_df = pd.DataFrame()
-        corr_df["Bin"] = numerator_df["Bin"]
-
-        # Compute normalized correlation for each model
-        for model in ["loth", "markhvida", "DuNing", "vitor", "markov"]:
-            num_col = f"numerator_{model}"
-            denom_val = denominators[f"denominator_{model}"]
-            corr_df[f"Correlation_{model}"] = numerator_df[num_col] / (np.sqrt(denom_val) ** 2)
+        corr_df = final_corr_table(numerator_df, denominator_df)
 
         # Save output
         output_file = output_dir / f"WithinCorrSaavg2({period:.2f})ind.csv"
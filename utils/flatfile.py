@@ -0,0 +1,171 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Explicit dtypes of the flatfile columns (other columns are inferred by pandas)
+FLATFILE_DTYPES = {
+    'RSN': np.int64, 'EQID': np.int64, 'magnitude': np.float64,
+    'Rjb': np.float64, 'Rrup': np.float64, 'Ztor': np.float64, 'Rx': np.float64,
+    'dip': np.float64, 'Z1': np.float64, 'rup_width': np.float64, 'Z2pt5': np.float64,
+    'D_hyp': np.float64, 'Vs30': np.float64, 'rake': np.float64, 'mechanism': np.int64,
+    'Station_latitude': np.float64, 'Station_longitude': np.float64, 'database': str,
+}
+
+
+def get_file_hash(file_path: Path, block_size=1 << 20):
+    key = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            key.update(block)
+    return key.hexdigest()
+
+
+def get_usecols(columns, filters):
+    # Filtered columns must be read even if they are not kept
+    if columns is None:
+        return None
+    return list(dict.fromkeys(list(columns) + list(filters or [])))
+
+
+def apply_filters(df, filters):
+    """
+    Keeps the rows of `df` that satisfy every filter in `filters`, a dict of
+    {column: condition} where the condition is one of:
+        - a scalar: column == value (e.g. {'EQID': 30})
+        - a tuple (min, max): min <= column <= max, None for an open bound
+          (e.g. {'magnitude': (6.0, None), 'Rrup': (None, 100)})
+        - a list/set/array: column in values (e.g. {'EQID': [30, 40]})
+        - a callable: returns a boolean mask from the column (e.g. {'Vs30': lambda v: v > 360})
+    """
+    if not filters:
+        return df
+
+    mask = np.ones(len(df), dtype=bool)
+    for col, condition in filters.items():
+        values = df[col]
+        if callable(condition):
+            mask &= np.asarray(condition(values), dtype=bool)
+        elif isinstance(condition, tuple):
+            low, high = condition
+            if low is not None:
+                mask &= np.asarray(values >= low)
+            if high is not None:
+                mask &= np.asarray(values <= high)
+        elif isinstance(condition, (list, set, np.ndarray, pd.Series)):
+            mask &= np.asarray(values.isin(list(condition)))
+        else:
+            mask &= np.asarray(values == condition)
+    return df[mask].reset_index(drop=True)
+
+
+def get_dtypes(file_path: Path):
+    header = pd.read_csv(file_path, nrows=0).columns
+    return {col: FLATFILE_DTYPES[col] for col in header if col in FLATFILE_DTYPES}
+
+
+def iter_flatfile(file_path: Path, columns=None, filters=None, chunksize=100_000):
+    """
+    Streams the flatfile in chunks of `chunksize` rows, yielding the filtered
+    rows of each chunk, so files larger than memory can be processed.
+    """
+    usecols = get_usecols(columns, filters)
+    for chunk in pd.read_csv(file_path, usecols=usecols, dtype=get_dtypes(file_path), chunksize=chunksize):
+        chunk = apply_filters(chunk, filters)
+        yield chunk if columns is None else chunk[list(columns)]
+
+
+def to_structured_array(df):
+    dtype = []
+    for col in df.columns:
+        if df[col].dtype == object:
+            # Fixed-width strings, so the array can be memory-mapped without pickling
+            width = max(1, int(df[col].astype(str).str.len().max() or 1))
+            dtype.append((col, f"U{width}"))
+        else:
+            dtype.append((col, df[col].dtype))
+    table = np.empty(len(df), dtype=dtype)
+    for col in df.columns:
+        table[col] = df[col].to_numpy()
+    return table
+
+
+def load_cached_flatfile(file_path: Path, cache_dir: Path, usecols=None, chunksize=None):
+    """
+    Returns the flatfile as a memory-mapped structured array, from a binary copy
+    in `cache_dir` keyed by the file hash and the columns (created on first use).
+
+    Only the `usecols` columns are read and cached (all of them by default). With
+    `chunksize`, the CSV is read in chunks of this many rows and the copy is written
+    chunk by chunk, so the whole file is never in memory.
+    """
+    cache_key = get_file_hash(file_path)
+    if usecols is not None:
+        cache_key += "_" + hashlib.sha1(repr(sorted(usecols)).encode()).hexdigest()[:12]
+    cache_path = cache_dir / f"{Path(file_path).stem}_{cache_key}.npy"
+    if cache_path.exists():
+        return np.load(cache_path, mmap_mode='r')
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    dtypes = get_dtypes(file_path)
+    if chunksize is None:
+        df = pd.read_csv(file_path, usecols=usecols, dtype=dtypes)
+        np.save(cache_path, to_structured_array(df))
+        return np.load(cache_path, mmap_mode='r')
+
+    def read_chunks():
+        return pd.read_csv(file_path, usecols=usecols, dtype=dtypes, chunksize=chunksize)
+
+    # First pass: number of rows and field types (e.g. the widest strings) of the copy
+    n_rows, fields = 0, {}
+    for chunk in read_chunks():
+        n_rows += len(chunk)
+        for name, (dtype, _) in to_structured_array(chunk).dtype.fields.items():
+            fields[name] = np.result_type(fields.get(name, dtype), dtype)
+
+    # Second pass: fill the copy, written to a temporary file until it is complete
+    tmp_path = cache_path.with_suffix(".tmp")
+    table = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=list(fields.items()), shape=(n_rows,))
+    start = 0
+    for chunk in read_chunks():
+        for col in chunk.columns:
+            table[col][start:start + len(chunk)] = chunk[col].to_numpy()
+        start += len(chunk)
+    table.flush()
+    del table
+    tmp_path.replace(cache_path)
+    return np.load(cache_path, mmap_mode='r')
+
+
+def load_flatfile(file_path: Path, columns=None, filters=None, chunksize=None, cache_dir: Path = None):
+    """
+    Loads a ground-motion flatfile (e.g. data/Database.csv or the NGA-West2 flatfile).
+
+    Args:
+        file_path (Path): CSV flatfile.
+        columns (list[str], optional): Columns to keep. Defaults to all columns.
+        filters (dict, optional): Row filters, see `apply_filters`.
+        chunksize (int, optional): If given, the CSV is streamed in chunks of this many rows
+            and only the filtered rows are kept in memory (with `cache_dir`, the binary copy
+            is written chunk by chunk).
+        cache_dir (Path, optional): If given, repeated loads read a memory-mapped binary
+            copy of the selected columns, keyed by the file hash, instead of parsing the CSV.
+
+    Returns:
+        pd.DataFrame: The selected rows and columns.
+    """
+    if cache_dir is not None:
+        usecols = get_usecols(columns, filters)
+        table = load_cached_flatfile(file_path, cache_dir, usecols, chunksize)
+        names = usecols or table.dtype.names
+        df = apply_filters(pd.DataFrame({col: np.array(table[col]) for col in names}), filters)
+    elif chunksize is not None:
+        chunks = list(iter_flatfile(file_path, columns, filters, chunksize))
+        return pd.concat(chunks, ignore_index=True)
+    else:
+        df = pd.read_csv(file_path, usecols=get_usecols(columns, filters), dtype=get_dtypes(file_path))
+        df = apply_filters(df, filters)
+
+    if columns is not None:
+        df = df[list(columns)]
+    return df
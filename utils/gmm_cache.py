@@ -0,0 +1,54 @@
+import os
+import hashlib
+import numpy as np
+from pathlib import Path
+
+# Sub-periods equal to this number of decimals [s] are the same period (sub-periods from
+# different linspace calls can differ in the last bit, e.g. 0.6 and 0.6000000000000001)
+PERIOD_DECIMALS = 10
+
+
+def get_cache_key(gsim, data, columns):
+    """
+    Content-addressed key for a GSIM and the record contexts in `data`,
+    defined by the database `columns` the GSIM requires.
+    """
+    ctx = np.ascontiguousarray(data[list(columns)].to_numpy(dtype=float))
+    key = hashlib.sha1(str(gsim).encode())
+    key.update(str(ctx.shape).encode())
+    key.update(ctx.tobytes())
+    return key.hexdigest()
+
+
+def period_key(period):
+    return round(float(period), PERIOD_DECIMALS)
+
+
+def period_file(cache_dir: Path, key, period):
+    return cache_dir / key / f"{period_key(period)!r}.npy"
+
+
+def load_cached_predictions(cache_dir: Path, key, periods):
+    """
+    Returns {period: array(4, n_records)} with the (mean, sig, tau, phi) of every
+    period already in the cache.
+    """
+    cached = {}
+    for p in periods:
+        path = period_file(cache_dir, key, p)
+        if path.exists():
+            cached[p] = np.load(path)
+    return cached
+
+
+def save_cached_predictions(cache_dir: Path, key, predictions):
+    """
+    Stores {period: array(4, n_records)} in the cache.
+    """
+    (cache_dir / key).mkdir(parents=True, exist_ok=True)
+    for p, values in predictions.items():
+        path = period_file(cache_dir, key, p)
+        # Write then rename, so concurrent runs never read a partial file
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npy")
+        np.save(tmp_path, values)
+        os.replace(tmp_path, path)
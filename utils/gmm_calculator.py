@@ -1,66 +1,245 @@
+import os
 import numpy as np
 import pandas as pd
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from openquake.hazardlib.gsim.aristeidou_2024 import AristeidouEtAl2024
 from openquake.hazardlib.contexts import full_context, simple_cmaker
 from openquake.hazardlib.contexts import SitesContext, RuptureContext, DistancesContext
-from openquake.hazardlib import imt
+from openquake.hazardlib import imt, valid
+from .gmm_cache import get_cache_key, load_cached_predictions, save_cached_predictions, period_key
+from .prediction_files import write_predictions
+from .flatfile import load_flatfile
+from .saavg import get_saavg_periods
 
-def compute_gmm_predictions(im, database_path: Path, output_dir: Path, avgsa_periods):
-    data = pd.read_csv(database_path)
-    gmm = AristeidouEtAl2024()
-    output_dir.mkdir(parents=True, exist_ok=True)
 
-    vs30 = np.array(data['Vs30'])
-    Mw = np.array(data['magnitude'])
-    rake = np.array(data['rake'])
-    Z2pt5 = np.array(data['Z2pt5'])
-    Rrup = np.array(data['Rrup'])
-    ztor = np.array(data['Ztor'])
-    hypo_depth = np.array(data['D_hyp'])
-    rjb = np.array(data['Rjb'])
-    rx = np.array(data['Rx'])
+# OpenQuake context parameters available in the database, and their columns
+CONTEXT_COLUMNS = {
+    'vs30': 'Vs30', 'z1pt0': 'Z1', 'z2pt5': 'Z2pt5',
+    'mag': 'magnitude', 'rake': 'rake', 'dip': 'dip', 'width': 'rup_width',
+    'ztor': 'Ztor', 'hypo_depth': 'D_hyp',
+    'rrup': 'Rrup', 'rjb': 'Rjb', 'rx': 'Rx',
+}
+
+
+def get_context_columns(gsim):
+    """
+    Returns {OpenQuake parameter: database column} for the parameters required by `gsim`.
+    """
+    required = sorted(gsim.REQUIRES_SITES_PARAMETERS | gsim.REQUIRES_RUPTURE_PARAMETERS |
+                      gsim.REQUIRES_DISTANCES)
+    missing = [par for par in required if par not in CONTEXT_COLUMNS]
+    if missing:
+        raise ValueError(f"{gsim} requires {missing}, which are not available in the database.")
+    return {par: CONTEXT_COLUMNS[par] for par in required}
+
+
+def build_batch_context(cmaker, gsim, data, sids):
+    """
+    Assembles a single context recarray for the records in `data`,
+    so that the GMM can be evaluated once for the whole batch.
+    """
+    columns = get_context_columns(gsim)
+    sites = SitesContext()
+    sites.__dict__.update({par: np.array(data[columns[par]]) for par in gsim.REQUIRES_SITES_PARAMETERS})
+    sites.sids = np.asarray(sids)
+    rup = RuptureContext()
+    rup.__dict__.update({par: np.array(data[columns[par]]) for par in gsim.REQUIRES_RUPTURE_PARAMETERS})
+    dists = DistancesContext()
+    dists.__dict__.update({par: np.array(data[columns[par]]) for par in gsim.REQUIRES_DISTANCES})
+
+    ctx = full_context(sites, rup, dists)
+    return cmaker.recarray([ctx])
+
+
+def evaluate_gmm(gmm, data, periods, batch_size=1000):
+    """
+    Evaluates the GMM for every record in `data` and every Sa(T) in `periods`.
+
+    Returns:
+        dict: {period: array(4, n_records)} with the (mean, sig, tau, phi) rows.
+    """
+    n_records = len(data)
+    im_objs = [imt.SA(p) for p in periods]
+
+    mags = sorted({str(m) for m in data['magnitude']})
+    cmaker = simple_cmaker([gmm], [obj.string for obj in im_objs], mags=mags)
+
+    mean = np.zeros((len(im_objs), n_records))
+    sig = np.zeros((len(im_objs), n_records))
+    tau = np.zeros((len(im_objs), n_records))
+    phi = np.zeros((len(im_objs), n_records))
+
+    batch_size = max(1, int(batch_size))
+    for start in range(0, n_records, batch_size):
+        stop = min(start + batch_size, n_records)
+        ctx = build_batch_context(cmaker, gmm, data.iloc[start:stop], np.arange(start, stop))
+        gmm.compute(ctx, im_objs, mean[:, start:stop], sig[:, start:stop],
+                    tau[:, start:stop], phi[:, start:stop])
+
+    return {p: np.stack([mean[i], sig[i], tau[i], phi[i]]) for i, p in enumerate(periods)}
+
+
+def predict_saavg(im, database_path: Path, avgsa_periods, batch_size=1000, stdev_only=False,
+                  cache_dir: Path = None, gsim=None, filters=None, flatfile_cache_dir: Path = None):
+    """
+    Computes GMM predictions (Mean, Stdev1=sigma, Stdev2=tau, Stdev3=phi) for every
+    record in the database and every Sa(T) sub-period of the requested Saavg periods.
+
+    The sub-periods of all `avgsa_periods` are evaluated together, and the records
+    are passed to the GMM in batches of `batch_size` contexts per `gmm.compute` call.
+
+    If `stdev_only` is True, only the stdevs of the first record (the representative
+    scenario read by the stdev-combination stages) are computed.
+
+    If `cache_dir` is given, predictions are stored there keyed by (GSIM, record
+    contexts, sub-period), and only sub-periods not already cached are computed.
+
+    `gsim` is an OpenQuake GSIM instance or name (defaults to AristeidouEtAl2024).
+
+    `filters` selects records of the database (e.g. {'magnitude': (6.0, None), 'Rrup': (None, 100)},
+    see `utils.flatfile.apply_filters`), and `flatfile_cache_dir` keeps a binary copy of the
+    database so that repeated loads do not parse the CSV.
+
+    Returns:
+        dict: {Saavg period: pd.DataFrame of predictions}
+    """
+    if gsim is None:
+        gmm = AristeidouEtAl2024()
+    else:
+        gmm = valid.gsim(gsim) if isinstance(gsim, str) else gsim
+
+    columns = ['RSN', 'EQID', 'magnitude'] + list(get_context_columns(gmm).values())
+    data = load_flatfile(database_path, columns=list(dict.fromkeys(columns)), filters=filters,
+                         cache_dir=flatfile_cache_dir)
+    if stdev_only:
+        # The stdev-combination stages only read the first RSN of each file
+        data = data.iloc[:1]
+
     RSNs = data['RSN'].values
     EQIDs = data['EQID'].values
-    sids = np.arange(len(vs30))
-
-    for T in avgsa_periods:
-        if im == 'Saavg2':
-            periods = np.linspace(0.2 * T, 2.0 * T, 10)
-        elif im == 'Saavg3':
-            periods = np.linspace(0.2 * T, 3.0 * T, 10)
-        im_objs = [imt.SA(p) for p in periods]
-        results = []
-
-        for idx in range(len(data)):
-            sites = SitesContext()
-            sites.__dict__.update({'z2pt5': Z2pt5[idx], 'vs30': vs30[idx], 'sids': np.array([sids[idx]])})
-            rup = RuptureContext()
-            rup.__dict__.update({'rake': rake[idx], 'mag': Mw[idx], 'ztor': ztor[idx], 'hypo_depth': hypo_depth[idx]})
-            dists = DistancesContext()
-            dists.__dict__.update({'rrup': Rrup[idx], 'rjb': rjb[idx], 'rx': rx[idx]})
-
-            ctx = full_context(sites, rup, dists)
-            cmaker = simple_cmaker([gmm], [obj.string for obj in im_objs], mags=[str(Mw[idx])])
-            ctx = cmaker.recarray([ctx])
-
-            mean = np.zeros((len(im_objs), 1))
-            sig = np.zeros((len(im_objs), 1))
-            tau = np.zeros((len(im_objs), 1))
-            phi = np.zeros((len(im_objs), 1))
-            gmm.compute(ctx, im_objs, mean, sig, tau, phi)
-
-            for i, im_obj in enumerate(im_objs):
-                results.append({
-                    'RSN': RSNs[idx],
-                    'EQID': EQIDs[idx],
-                    'Period': im_obj.period,
-                    'Mean': np.exp(mean[i][0]),
-                    'Stdev1': sig[i][0],
-                    'Stdev2': tau[i][0],
-                    'Stdev3': phi[i][0]
-                })
-
-        output_file = output_dir / f"predicted_Saavg2_sa({T:.2f}).csv"
-        pd.DataFrame(results).to_csv(output_file, index=False)
-        print(f"Saved: {output_file}")
+    n_records = len(data)
+
+    # Unique sub-periods across all requested Saavg periods (matched by period_key,
+    # each evaluated at its first occurrence)
+    periods_by_T = {T: get_saavg_periods(im, T) for T in avgsa_periods}
+    representatives = {}
+    for periods in periods_by_T.values():
+        for p in periods:
+            representatives.setdefault(period_key(p), p)
+    unique_periods = list(representatives.values())
+
+    predictions = {}
+    if cache_dir is not None:
+        key = get_cache_key(gmm, data, get_context_columns(gmm).values())
+        predictions = load_cached_predictions(cache_dir, key, unique_periods)
+
+    missing = [p for p in unique_periods if p not in predictions]
+    if missing:
+        computed = evaluate_gmm(gmm, data, missing, batch_size)
+        if cache_dir is not None:
+            save_cached_predictions(cache_dir, key, computed)
+        predictions.update(computed)
+    print(f"GMM sub-periods: {len(missing)} computed, {len(unique_periods) - len(missing)} from cache")
+
+    results = {}
+    for T, periods in periods_by_T.items():
+        n_periods = len(periods)
+        values = np.stack([predictions[representatives[period_key(p)]] for p in periods], axis=2)  # (4, n_records, n_periods)
+        results[T] = pd.DataFrame({
+            'RSN': np.repeat(RSNs, n_periods),
+            'EQID': np.repeat(EQIDs, n_periods),
+            'Period': np.tile([imt.SA(p).period for p in periods], n_records),
+            'Mean': np.exp(values[0].ravel()),
+            'Stdev1': values[1].ravel(),
+            'Stdev2': values[2].ravel(),
+            'Stdev3': values[3].ravel()
+        })
+        if stdev_only:
+            results[T] = results[T].drop(columns='Mean')
+    return results
+
+
+def compute_gmm_predictions(im, database_path: Path, output_dir: Path, avgsa_periods, batch_size=1000,
+                            stdev_only=False, cache_dir: Path = None, gsim=None, file_format='csv',
+                            filters=None, flatfile_cache_dir: Path = None):
+    """
+    Computes the GMM predictions with `predict_saavg` and saves one file per Saavg period.
+
+    `file_format` selects the output files: 'csv', 'npy' (typed binary columns that
+    are memory-mapped when read back) or 'both'.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    predictions = predict_saavg(im, database_path, avgsa_periods, batch_size, stdev_only, cache_dir,
+                                gsim, filters, flatfile_cache_dir)
+    for T, results in predictions.items():
+        for output_file in write_predictions(results, output_dir, T, file_format):
+            print(f"Saved: {output_file}")
+
+
+def get_branch_names(gsims):
+    """
+    Names each logic-tree branch after its GSIM class, numbering repeated classes.
+    """
+    names = [type(gsim).__name__ for gsim in gsims]
+    return [f"{name}_{names[:i].count(name) + 1}" if names.count(name) > 1 else name
+            for i, name in enumerate(names)]
+
+
+def get_logic_tree(gsims, weights=None):
+    """
+    Checks the GSIMs and weights of a logic tree.
+
+    Returns:
+        tuple: (GSIM instances, weights, branch names)
+    """
+    gsims = [valid.gsim(gsim) if isinstance(gsim, str) else gsim for gsim in gsims]
+    if weights is None:
+        weights = np.full(len(gsims), 1.0 / len(gsims))
+    weights = np.asarray(weights, dtype=float)
+    if len(weights) != len(gsims):
+        raise ValueError("There must be one weight per GSIM.")
+    if not np.isclose(weights.sum(), 1.0):
+        raise ValueError(f"Logic-tree weights must sum to 1, got {weights.sum()}.")
+
+    for gsim in gsims:
+        get_context_columns(gsim)  # fail early if a GSIM needs data we do not have
+    return gsims, weights, get_branch_names(gsims)
+
+
+def compute_gmm_logic_tree(im, database_path: Path, output_dir: Path, avgsa_periods, gsims,
+                           weights=None, n_workers=None, **kwargs):
+    """
+    Computes the GMM predictions of every branch of a GSIM logic tree in a process pool.
+
+    Each branch is written to `output_dir/<branch>/` with the same files as
+    `compute_gmm_predictions`, so the downstream stages can be run per branch, and
+    the branches and their weights are saved in `output_dir/logic_tree.csv`
+    (see `utils.pipeline.run_logic_tree` for the weighted correlations).
+
+    Args:
+        gsims (list): OpenQuake GSIM instances or names (e.g. "BooreEtAl2014").
+        weights (list[float], optional): Branch weights, summing to 1. Defaults to equal weights.
+        n_workers (int, optional): Number of processes. Defaults to one per branch (up to the CPU count).
+        **kwargs: Passed to `compute_gmm_predictions` (batch_size, stdev_only, cache_dir, file_format,
+            filters, flatfile_cache_dir).
+
+    Returns:
+        pd.DataFrame: The logic tree (Branch, GSIM, Weight).
+    """
+    gsims, weights, branches = get_logic_tree(gsims, weights)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    n_workers = n_workers or min(len(gsims), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        # GSIMs are sent as their TOML representation, which is cheap to pickle
+        futures = [pool.submit(compute_gmm_predictions, im, database_path, output_dir / branch,
+                               avgsa_periods, gsim=str(gsim), **kwargs)
+                   for branch, gsim in zip(branches, gsims)]
+        for future in futures:
+            future.result()
+
+    logic_tree = pd.DataFrame({'Branch': branches, 'GSIM': [str(gsim) for gsim in gsims], 'Weight': weights})
+    logic_tree.to_csv(output_dir / "logic_tree.csv", index=False)
+    print(f"Saved: {output_dir / 'logic_tree.csv'}")
+    return logic_tree
@@ -0,0 +1,117 @@
+"""
+Global deduplication of the Sa(Ti)-Sa(Tj) pairs of a run.
+
+The sub-periods of different Saavg periods overlap (e.g. Saavg2(0.5) and Saavg2(1.0)
+share 0.2, 0.4, ..., 1.0 s), and within- and total-residual runs use the same ones.
+The planner collects every unique (Ti, Tj, model) pair needed by the whole run,
+evaluates the distance curve of each pair once, and assembles the numerators of every
+period from that shared table. All the models are symmetric in (Ti, Tj), so (Tj, Ti)
+is the same pair.
+"""
+import numpy as np
+
+from .corr_engine import (CORRELATION_MODELS, TOTAL_MODELS, DEFAULT_BINS, evaluation_bins, quadratic_form,
+                          tables_from_sums)
+from .scheduler import read_inputs, save_period_tables
+from .gmm_cache import PERIOD_DECIMALS
+
+
+def plan_pairs(sub_periods, models):
+    """
+    Collects the unique pairs of sub-periods needed by each model.
+
+    Args:
+        sub_periods (dict): {key: array of sub-periods}, e.g. {('within', 1.0): periods}.
+        models (dict): {key: list of the models (keys of CORRELATION_MODELS) of that key}.
+
+    Returns:
+        dict: 'periods' (unique sub-periods), 'index' ({key: positions of its sub-periods
+            in 'periods'}), 'pairs' ({model: unique pair codes i * n + j, with i <= j}),
+            'requested' and 'unique' (number of pair curves before and after deduplication).
+    """
+    rounded = {key: np.round(np.asarray(periods, dtype=float), PERIOD_DECIMALS)
+               for key, periods in sub_periods.items()}
+    periods = np.unique(np.concatenate(list(rounded.values())))
+    index = {key: np.searchsorted(periods, values) for key, values in rounded.items()}
+
+    codes, requested = {}, 0
+    for key, positions in index.items():
+        for name in models[key]:
+            codes.setdefault(name, []).append(pair_codes(positions, len(periods)).ravel())
+            requested += len(positions) ** 2
+    pairs = {name: np.unique(np.concatenate(values)) for name, values in codes.items()}
+    return {'periods': periods, 'index': index, 'pairs': pairs,
+            'requested': requested, 'unique': sum(len(values) for values in pairs.values())}
+
+
+def pair_codes(positions, n_periods):
+    # Code of every (i, j) pair of `positions`, the same for (j, i)
+    lower = np.minimum.outer(positions, positions)
+    upper = np.maximum.outer(positions, positions)
+    return lower * n_periods + upper
+
+
+def evaluate_pairs(plan, bin_values):
+    """
+    Evaluates the distance curve of every unique pair of the plan once.
+
+    Returns:
+        dict: {model: array(n_unique_pairs, n_bins)}
+    """
+    periods, n_periods = plan['periods'], len(plan['periods'])
+    table = {}
+    for name, codes in plan['pairs'].items():
+        model = CORRELATION_MODELS[name]
+        T1, T2 = periods[codes // n_periods], periods[codes % n_periods]
+        if model.vectorized:
+            table[name] = np.broadcast_to(model.sa_correlation(T1[:, None], T2[:, None], bin_values[None, :]),
+                                          (len(codes), len(bin_values)))
+        else:
+            table[name] = np.array([model.correlation(t1, t2, bin_values)[0, 0] for t1, t2 in zip(T1, T2)])
+    return table
+
+
+def assemble_numerators(plan, table, key, stdevs, models):
+    """
+    sum_ij rho_ij(h) s_i s_j of each model for the sub-periods of `key`, from the pair table.
+    """
+    positions, n_periods = plan['index'][key], len(plan['periods'])
+    codes = pair_codes(positions, n_periods)
+    sums = {}
+    for name in models:
+        rho = table[name][np.searchsorted(plan['pairs'][name], codes)]
+        sums[name] = quadratic_form(rho, stdevs)
+    return sums
+
+
+def compute_stages_planned(avgsa_periods, stdev_dirs, corr_output_dirs=None, bin_values=None,
+                           between_model='GodaAtkinson2009', weights=None, im='Saavg2'):
+    """
+    Runs the numerator, denominator and final-correlation stages of every period (as
+    compute_stages_parallel, writing the same files) from a single table of the unique
+    pairs of the run, and reports the deduplication ratio.
+
+    Returns:
+        dict: {residual: {period: pd.DataFrame with Bin and Correlation_<model> columns}}
+    """
+    bin_values = DEFAULT_BINS if bin_values is None else np.asarray(bin_values, dtype=float)
+    corr_output_dirs = corr_output_dirs or {}
+    for output_dir in corr_output_dirs.values():
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    inputs = {(residual, period): read_inputs(residual, stdev_dir, period, weights, between_model)
+              for residual, stdev_dir in stdev_dirs.items() for period in avgsa_periods}
+    models = {key: list(CORRELATION_MODELS) if key[0] == 'within' else TOTAL_MODELS for key in inputs}
+    plan = plan_pairs({key: values[0] for key, values in inputs.items()}, models)
+    print(f"Pair curves: {plan['requested']} requested, {plan['unique']} unique "
+          f"(deduplication ratio {plan['requested'] / plan['unique']:.1f})")
+
+    table = evaluate_pairs(plan, evaluation_bins(bin_values))
+    results = {residual: {} for residual in stdev_dirs}
+    for (residual, period), (_, stdevs, divisor, tau, rho_between) in inputs.items():
+        sums = assemble_numerators(plan, table, (residual, period), stdevs, models[residual, period])
+        numerator_df, denominator_df = tables_from_sums(bin_values, sums, divisor, tau, rho_between,
+                                                          weights)[residual]
+        results[residual][period] = save_period_tables(
+            residual, period, numerator_df, denominator_df, stdev_dirs, corr_output_dirs, im)
+    return results
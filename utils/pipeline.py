@@ -0,0 +1,249 @@
+"""
+In-memory runner for the indirect Saavg(T) spatial-correlation pipeline.
+
+The stages (GMM stdevs -> numerators -> denominators -> final correlations) pass
+DataFrames to each other directly. Within-event and total residuals share a single
+evaluation of the spatial correlation models. With a `checkpoint_dir`, every stage output is
+saved together with a hash of its inputs, so stages with unchanged inputs are
+skipped and an interrupted multi-period run resumes from the last completed stage.
+"""
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from .flatfile import get_file_hash
+from .stdev_and_corr import get_first_rsn_stdevs
+from .stdev_and_corr_total import between_event_correlation
+from .corr_final import final_corr_table
+from .corr_engine import CORRELATION_MODELS, DEFAULT_BINS, TOTAL_MODELS, residual_tables, reduce_saavg
+from .saavg import get_saavg_periods, get_saavg_weights
+
+MANIFEST_FILE = "manifest.json"
+
+# Prefix of the final correlation files of each type of residual
+OUTPUT_PREFIXES = {'within': 'WithinCorr', 'total': 'TotalCorr'}
+
+
+def hash_inputs(*inputs):
+    """
+    Content hash of the inputs of a stage (DataFrames, arrays or plain values).
+    """
+    key = hashlib.sha1()
+    for item in inputs:
+        if isinstance(item, pd.DataFrame):
+            key.update(str(list(item.columns)).encode())
+            key.update(pd.util.hash_pandas_object(item, index=False).values.tobytes())
+        elif isinstance(item, np.ndarray):
+            key.update(np.ascontiguousarray(item).tobytes())
+        else:
+            key.update(repr(item).encode())
+    return key.hexdigest()
+
+
+def load_manifest(checkpoint_dir: Path):
+    if checkpoint_dir is None or not (checkpoint_dir / MANIFEST_FILE).exists():
+        return {}
+    with open(checkpoint_dir / MANIFEST_FILE) as f:
+        return json.load(f)
+
+
+def save_manifest(checkpoint_dir: Path, manifest):
+    tmp_path = checkpoint_dir / f"{MANIFEST_FILE}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    tmp_path.replace(checkpoint_dir / MANIFEST_FILE)
+
+
+def run_stage(name, period, inputs, func, checkpoint_dir: Path = None, manifest=None):
+    """
+    Runs `func()` for a stage, unless its checkpoint exists and was computed from the same inputs.
+    """
+    stage_key = f"{name}_{period:.2f}"
+    input_hash = hash_inputs(name, *inputs)
+
+    if checkpoint_dir is not None:
+        stage_file = checkpoint_dir / f"{stage_key}.csv"
+        if manifest.get(stage_key) == input_hash and stage_file.exists():
+            print(f"Skipping {stage_key} (inputs unchanged)")
+            return pd.read_csv(stage_file, float_precision="round_trip")
+
+    output = func()
+
+    if checkpoint_dir is not None:
+        output.to_csv(stage_file, index=False)
+        manifest[stage_key] = input_hash
+        save_manifest(checkpoint_dir, manifest)
+    return output
+
+
+def predict_stdevs(im, database_path: Path, period, **gmm_kwargs):
+    """
+    Stdevs of the sub-periods of a Saavg period for a representative scenario.
+    """
+    # OpenQuake is only loaded when a stdevs stage has to run
+    from .gmm_calculator import predict_saavg
+    return get_first_rsn_stdevs(
+        predict_saavg(im, database_path, [period], stdev_only=True, **gmm_kwargs)[period])
+
+
+def run_pipeline(im, database_path: Path, avgsa_periods, corr_output_dir: Path = None,
+                 checkpoint_dir: Path = None, bin_values=None, residuals=('within',),
+                 between_model='GodaAtkinson2009', tolerance=None, quadrature_tolerance=None, min_spacing=0.01,
+                 **gmm_kwargs):
+    """
+    Runs the indirect approach of spatial correlation for Saavg(T), without
+    intermediate CSV hand-offs.
+
+    Args:
+        im (str): 'Saavg2', 'Saavg3' or a definition registered with utils.saavg.register_saavg.
+        database_path (Path): Flatfile used for the GMM predictions.
+        avgsa_periods (list[float]): List of periods to process.
+        corr_output_dir (Path, optional): If given, the final correlations are saved there.
+        checkpoint_dir (Path, optional): If given, stage outputs are saved there and reused.
+        bin_values (array, optional): Separation distances [km], any (e.g. finer near h = 0,
+            or beyond 150 km). Defaults to 0-150 km every 1 km.
+        tolerance (float, optional): If given, `bin_values` is the initial grid of an adaptive
+            grid, bisected where the correlation curves are not linear within `tolerance`.
+        min_spacing (float): Shortest interval [km] of the adaptive grid.
+        residuals (tuple[str]): 'within' and/or 'total'. Both are computed from the same
+            evaluation of the spatial correlation models.
+        between_model (str): OpenQuake cross-correlation model of the between-event
+            correlations of the total residuals (see BETWEEN_MODELS).
+        quadrature_tolerance (float, optional): If given, `im` is approximated with the fewest
+            Gaussian-quadrature sub-periods whose correlations are within this tolerance of
+            those of `im` at every period of `avgsa_periods` (see reduce_saavg), and the
+            error at each period is reported. Output files keep the name of `im`.
+        **gmm_kwargs: Passed to `predict_saavg` (e.g. cache_dir, gsim, filters).
+
+    Returns:
+        dict: {residual: {period: pd.DataFrame with Bin and Correlation_<model> columns}}
+    """
+    if isinstance(residuals, str):
+        residuals = (residuals,)
+    for residual in residuals:
+        if residual not in OUTPUT_PREFIXES:
+            raise ValueError(f"Unknown residual '{residual}', use 'within' or 'total'.")
+    # Models without a between-event counterpart are only needed for within-event residuals
+    # (residual_tables leaves them out of the total tables)
+    models = list(CORRELATION_MODELS) if 'within' in residuals else TOTAL_MODELS
+
+    bin_values = DEFAULT_BINS if bin_values is None else np.asarray(bin_values, dtype=float)
+    if checkpoint_dir is not None:
+        checkpoint_dir.mkdir(parents=True, exist_ok=True)
+    if corr_output_dir is not None:
+        corr_output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(checkpoint_dir)
+    # Saavg definition actually evaluated
+    definition = im
+    if quadrature_tolerance is not None:
+        definition, _ = reduce_saavg(
+            im, sorted(set(avgsa_periods)),
+            lambda name, T: predict_stdevs(name, database_path, T, **gmm_kwargs)['Stdev3'].to_numpy(),
+            quadrature_tolerance, bin_values, models)
+    weights = get_saavg_weights(definition)
+    database_hash = get_file_hash(database_path)
+
+    results = {residual: {} for residual in residuals}
+    for period in avgsa_periods:
+        # Only the stdevs of a representative scenario are needed. The resolved definition
+        # is hashed, so re-registering a name with other sub-periods or weights reruns it
+        stdev_df = run_stage(
+            "stdevs", period, (database_hash, definition, period, get_saavg_periods(definition, period),
+                               weights, sorted(gmm_kwargs.items())),
+            lambda: predict_stdevs(definition, database_path, period, **gmm_kwargs),
+            checkpoint_dir, manifest)
+        periods = stdev_df['Period'].to_numpy()
+
+        # Evaluated at most once per period, and only if a stage below is not checkpointed
+        tables = {}
+
+        def get_tables():
+            if not tables:
+                total = 'total' in residuals
+                tables.update(residual_tables(
+                    periods, stdev_df['Stdev3'].to_numpy(), bin_values, models,
+                    tau=stdev_df['Stdev2'].to_numpy() if total else None,
+                    rho_between=between_event_correlation(periods, between_model) if total else None,
+                    tolerance=tolerance, weights=weights, min_spacing=min_spacing))
+            return tables
+
+        for residual in residuals:
+            columns = ['Period', 'Stdev3'] + (['Stdev2'] if residual == 'total' else [])
+            stage_inputs = (stdev_df[columns], bin_values, models, weights)
+            if tolerance is not None:
+                stage_inputs += (tolerance, min_spacing)
+            if residual == 'total':
+                stage_inputs += (between_model,)
+
+            numerator_df = run_stage(
+                f"{residual}_numerator", period, stage_inputs,
+                lambda: get_tables()[residual][0], checkpoint_dir, manifest)
+            denominator_df = run_stage(
+                f"{residual}_denominator", period, stage_inputs,
+                lambda: get_tables()[residual][1], checkpoint_dir, manifest)
+            corr_df = run_stage(
+                f"{residual}_final", period, (numerator_df, denominator_df),
+                lambda: final_corr_table(numerator_df, denominator_df), checkpoint_dir, manifest)
+
+            if corr_output_dir is not None:
+                output_file = corr_output_dir / f"{OUTPUT_PREFIXES[residual]}{im}({period:.2f})ind.csv"
+                corr_df.to_csv(output_file, index=False)
+                print(f"Final correlation saved: {output_file.name}")
+            results[residual][period] = corr_df
+
+    return results
+
+
+def run_logic_tree(im, database_path: Path, avgsa_periods, gsims, weights=None, corr_output_dir: Path = None,
+                   checkpoint_dir: Path = None, **kwargs):
+    """
+    Runs `run_pipeline` for every branch of a GSIM logic tree and combines the final
+    correlations of the branches, weighted by the branch weights.
+
+    Each branch is saved in its own subfolder of `corr_output_dir` and `checkpoint_dir`,
+    and the weighted correlations in `corr_output_dir` itself (with `logic_tree.csv`).
+    Branches evaluated on different bins (adaptive grids) are interpolated linearly
+    onto the union of their bins.
+
+    Args:
+        gsims (list): OpenQuake GSIM instances or names (e.g. "BooreEtAl2014").
+        weights (list[float], optional): Branch weights, summing to 1. Defaults to equal weights.
+        **kwargs: Passed to `run_pipeline` (e.g. residuals, bin_values, cache_dir).
+
+    Returns:
+        dict: {residual: {period: pd.DataFrame with Bin and Correlation_<model> columns}}
+    """
+    from .gmm_calculator import get_logic_tree
+    gsims, weights, branches = get_logic_tree(gsims, weights)
+
+    branch_results = [
+        run_pipeline(im, database_path, avgsa_periods,
+                     corr_output_dir / branch if corr_output_dir is not None else None,
+                     checkpoint_dir / branch if checkpoint_dir is not None else None,
+                     gsim=str(gsim), **kwargs)
+        for branch, gsim in zip(branches, gsims)]
+
+    results = {}
+    for residual, period_results in branch_results[0].items():
+        results[residual] = {}
+        for period in period_results:
+            dfs = [branch_result[residual][period] for branch_result in branch_results]
+            bins = np.unique(np.concatenate([df['Bin'].to_numpy() for df in dfs]))
+            corr_df = pd.DataFrame({'Bin': bins})
+            for column in dfs[0].columns.drop('Bin'):
+                corr_df[column] = sum(weight * np.interp(bins, df['Bin'], df[column])
+                                      for weight, df in zip(weights, dfs))
+            results[residual][period] = corr_df
+
+            if corr_output_dir is not None:
+                output_file = corr_output_dir / f"{OUTPUT_PREFIXES[residual]}{im}({period:.2f})ind.csv"
+                corr_df.to_csv(output_file, index=False)
+                print(f"Final correlation saved: {output_file.name}")
+
+    if corr_output_dir is not None:
+        logic_tree = pd.DataFrame({'Branch': branches, 'GSIM': [str(gsim) for gsim in gsims], 'Weight': weights})
+        logic_tree.to_csv(corr_output_dir / "logic_tree.csv", index=False)
+        print(f"Saved: {corr_output_dir / 'logic_tree.csv'}")
+    return results
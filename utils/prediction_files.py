@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Typed columns of the binary predicted files ("Mean" is absent for stdev-only files)
+PREDICTION_DTYPES = {
+    'RSN': np.int64, 'EQID': np.int64, 'Period': np.float64, 'Mean': np.float64,
+    'Stdev1': np.float64, 'Stdev2': np.float64, 'Stdev3': np.float64,
+}
+
+
+def get_prediction_path(predicted_dir: Path, period, file_format='csv'):
+    return predicted_dir / f"predicted_Saavg2_sa({period:.2f}).{file_format}"
+
+
+def write_predictions(results: pd.DataFrame, predicted_dir: Path, period, file_format='csv'):
+    """
+    Saves GMM predictions as CSV ('csv'), as a binary structured array ('npy'), or both ('both').
+
+    The .npy file stores typed columns with the rows of each RSN contiguous,
+    so it can be memory-mapped and sliced by RSN without parsing.
+    """
+    if file_format not in ('csv', 'npy', 'both'):
+        raise ValueError("file_format must be 'csv', 'npy' or 'both'.")
+
+    output_files = []
+    if file_format in ('csv', 'both'):
+        output_file = get_prediction_path(predicted_dir, period, 'csv')
+        results.to_csv(output_file, index=False)
+        output_files.append(output_file)
+
+    if file_format in ('npy', 'both'):
+        dtype = [(col, PREDICTION_DTYPES[col]) for col in results.columns]
+        table = np.empty(len(results), dtype=dtype)
+        for col in results.columns:
+            table[col] = results[col].to_numpy()
+        output_file = get_prediction_path(predicted_dir, period, 'npy')
+        np.save(output_file, table)
+        output_files.append(output_file)
+
+    return output_files
+
+
+def get_first_block_length(rsn, chunk=1024):
+    """
+    Number of leading rows sharing the first RSN, scanning the (memory-mapped)
+    column in chunks so only the start of the file is read.
+    """
+    for start in range(0, len(rsn), chunk):
+        other = np.flatnonzero(rsn[start:start + chunk] != rsn[0])
+        if len(other):
+            return start + other[0]
+    return len(rsn)
+
+
+def read_predictions(predicted_dir: Path, period, first_rsn_only=False):
+    """
+    Reads the GMM predictions of a Saavg period, preferring the memory-mapped .npy
+    file over the CSV when both exist.
+
+    If `first_rsn_only` is True, only the rows of the first RSN are returned.
+    """
+    npy_path = get_prediction_path(predicted_dir, period, 'npy')
+    if npy_path.exists():
+        table = np.load(npy_path, mmap_mode='r')
+        if first_rsn_only:
+            table = table[:get_first_block_length(table['RSN'])]
+        return pd.DataFrame({col: np.array(table[col]) for col in table.dtype.names})
+
+    df = pd.read_csv(get_prediction_path(predicted_dir, period, 'csv'))
+    if first_rsn_only:
+        df = df[df['RSN'] == df['RSN'].iloc[0]]
+    return df
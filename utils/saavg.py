@@ -0,0 +1,128 @@
+"""
+Definitions of Saavg(T): the Sa(T) sub-periods (as multiples of T) and the weights of
+ln Saavg = sum_i w_i ln Sa(T_i). Besides Saavg2 and Saavg3, other definitions can be
+registered, e.g. 40 log-spaced sub-periods:
+
+    register_saavg('Saavg2log', 0.2, 2.0, n_periods=40, spacing='log')
+
+A definition can also be approximated with fewer sub-periods, placed at the nodes of
+a Gaussian quadrature in log-period (see gauss_saavg).
+"""
+import numpy as np
+
+SAAVG_DEFINITIONS = {
+    'Saavg2': {'lower': 0.2, 'upper': 2.0, 'n_periods': 10, 'spacing': 'linear', 'factors': None,
+               'weights': np.full(10, 1 / 10)},
+    'Saavg3': {'lower': 0.2, 'upper': 3.0, 'n_periods': 10, 'spacing': 'linear', 'factors': None,
+               'weights': np.full(10, 1 / 10)},
+}
+
+
+def register_saavg(name, lower=None, upper=None, n_periods=10, spacing='linear', factors=None, weights=None):
+    """
+    Registers a Saavg definition, usable wherever 'Saavg2' or 'Saavg3' are.
+
+    Args:
+        name (str): Name of the IM, e.g. 'Saavg2log'.
+        lower, upper (float): Range of the sub-periods, as multiples of T.
+        n_periods (int): Number of sub-periods between `lower` and `upper`.
+        spacing (str): 'linear' or 'log'.
+        factors (array, optional): Sub-periods as multiples of T, instead of a range.
+        weights (array, optional): Weights of the sub-periods (normalized to sum 1).
+            Defaults to equal weights, 1 / n_periods.
+    """
+    if spacing not in ('linear', 'log'):
+        raise ValueError(f"Unknown spacing '{spacing}', use 'linear' or 'log'.")
+    if factors is None and (lower is None or upper is None):
+        raise ValueError("Give either the range (lower, upper) or the factors of the sub-periods.")
+    if factors is not None:
+        factors = np.asarray(factors, dtype=float)
+        n_periods = len(factors)
+    if weights is None:
+        weights = np.full(n_periods, 1 / n_periods)
+    weights = np.asarray(weights, dtype=float)
+    if len(weights) != n_periods or np.any(weights < 0):
+        raise ValueError(f"There must be {n_periods} non-negative weights.")
+    weights = weights / weights.sum()
+    SAAVG_DEFINITIONS[name] = {'lower': lower, 'upper': upper, 'n_periods': n_periods,
+                               'spacing': spacing, 'factors': factors, 'weights': weights}
+
+
+def get_definition(im):
+    if im not in SAAVG_DEFINITIONS:
+        raise ValueError(f"Unknown IM '{im}', use one of {list(SAAVG_DEFINITIONS)} or register it.")
+    return SAAVG_DEFINITIONS[im]
+
+
+def get_saavg_periods(im, T):
+    """
+    Returns the Sa(T) sub-periods used to define Saavg(T), e.g. Saavg2(T) or Saavg3(T).
+    """
+    definition = get_definition(im)
+    if definition['factors'] is not None:
+        return definition['factors'] * T
+    space = np.geomspace if definition['spacing'] == 'log' else np.linspace
+    return space(definition['lower'] * T, definition['upper'] * T, definition['n_periods'])
+
+
+def get_saavg_weights(im):
+    """
+    Returns the weights of the sub-periods of `im` (summing to 1).
+    """
+    return get_definition(im)['weights']
+
+
+def weighted_stdevs(stdevs, weights=None):
+    """
+    Scales the stdevs of the sub-periods by their weights, for the covariance of
+    ln Saavg = sum_i w_i ln Sa(T_i), i.e. sum_ij rho_ij s_i s_j / divisor.
+
+    Equal weights (the default) are factored out of the sum: the stdevs are returned
+    unchanged with divisor n^2 (100 for Saavg2 and Saavg3, as in the original script).
+    Other weights are applied to the stdevs, with divisor 1.
+
+    Returns:
+        tuple: (stdevs, divisor)
+    """
+    stdevs = np.asarray(stdevs, dtype=float)
+    weights = None if weights is None else np.asarray(weights, dtype=float)
+    if weights is None or np.all(weights == weights[0]):
+        return stdevs, len(stdevs) ** 2
+    return weights / weights.sum() * stdevs, 1
+
+
+def gauss_saavg(im, n_nodes):
+    """
+    Registers the approximation of `im` with `n_nodes` sub-periods: the Gaussian
+    quadrature in ln(T) of the sub-periods and weights of `im` (as Gauss-Legendre is for
+    a uniform average), which averages every polynomial in ln(T) of degree < 2 n_nodes
+    exactly as `im` does. With as many nodes as `im` has sub-periods, it is `im` itself.
+
+    Returns:
+        str: Name of the registered definition, e.g. 'Saavg2_G4'.
+    """
+    definition = get_definition(im)
+    if not 1 <= n_nodes <= definition['n_periods']:
+        raise ValueError(f"n_nodes must be between 1 and {definition['n_periods']}.")
+    x = np.log(get_saavg_periods(im, 1.0))
+    w = get_saavg_weights(im)
+
+    # Three-term recurrence of the polynomials orthogonal on (x, w) (Stieltjes procedure)
+    alpha, beta = np.zeros(n_nodes), np.zeros(n_nodes)
+    p_previous, p = np.zeros_like(x), np.ones_like(x)
+    norm_previous = 1.0
+    for k in range(n_nodes):
+        norm = (w * p * p).sum()
+        alpha[k] = (w * x * p * p).sum() / norm
+        beta[k] = norm / norm_previous if k > 0 else 0.0
+        p_previous, p = p, (x - alpha[k]) * p - beta[k] * p_previous
+        norm_previous = norm
+
+    # Golub-Welsch: nodes and weights from the eigenpairs of the Jacobi matrix
+    off_diagonal = np.sqrt(beta[1:])
+    jacobi = np.diag(alpha) + np.diag(off_diagonal, 1) + np.diag(off_diagonal, -1)
+    nodes, vectors = np.linalg.eigh(jacobi)
+
+    name = f"{im}_G{n_nodes}"
+    register_saavg(name, factors=np.exp(nodes), weights=vectors[0] ** 2)
+    return name
@@ -0,0 +1,130 @@
+"""
+Parallel scheduling of the numerator, denominator and final-correlation stages.
+
+Each (avgsa period, model, residual type) is a work unit, evaluated in a process pool.
+Each unit evaluates one model for the sub-periods of one Saavg period, exactly as the
+serial stages do, and the parent assembles the tables of a period (in the fixed order
+of the models) as soon as all of its units are done. The outputs therefore do not depend
+on the number of workers or on the order in which the units finish.
+"""
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .corr_engine import (CORRELATION_MODELS, TOTAL_MODELS, DEFAULT_BINS, accumulate_numerators,
+                          evaluation_bins, get_period_stdevs, tables_from_sums)
+from .corr_final import final_corr_table
+from .pipeline import OUTPUT_PREFIXES
+from .saavg import weighted_stdevs
+from .stdev_and_corr_total import between_event_correlation, get_total_stdevs
+
+
+def init_worker(interpolation_grids):
+    """
+    Loads the read-only model tables once per worker: the MAO26 parameter store
+    (memory-mapped, so its pages are shared by all the workers) and the MAO26
+    interpolation grids registered in the parent process.
+    """
+    from models import monteiroEtAl26
+    from models.mao26_store import open_parameter_store
+    open_parameter_store()
+    monteiroEtAl26.interpolation_grids.update(interpolation_grids)
+
+
+def evaluate_unit(periods, stdevs, eval_bins, model):
+    """
+    Work unit: sum_ij rho_ij(h) s_i s_j of one model for the sub-periods of one Saavg period.
+    """
+    return accumulate_numerators(periods, stdevs, eval_bins, [model])[model]
+
+
+def read_inputs(residual, stdev_dir: Path, period, weights=None, between_model='GodaAtkinson2009'):
+    """
+    Periods, weighted within-event stdevs and their divisor (see weighted_stdevs), and
+    between-event stdevs and correlations (None for within-event residuals) of one Saavg period.
+    """
+    stdev_df = pd.read_csv(stdev_dir / f"stdev_combinations_{period:.2f}.csv")
+    if residual == 'within':
+        periods, phi = get_period_stdevs(stdev_df, 'stdev3')
+        return (periods, *weighted_stdevs(phi, weights), None, None)
+    periods, tau, phi = get_total_stdevs(stdev_df)
+    return (periods, *weighted_stdevs(phi, weights), tau, between_event_correlation(periods, between_model))
+
+
+def compute_stages_parallel(avgsa_periods, stdev_dirs, corr_output_dirs=None, n_workers=None, bin_values=None,
+                            between_model='GodaAtkinson2009', weights=None, im='Saavg2'):
+    """
+    Runs compute_numerators, compute_denominators and compute_final_corr (and their
+    _total variants) for every period in a process pool, writing the same files.
+
+    Args:
+        avgsa_periods (list[float]): List of periods to process.
+        stdev_dirs (dict): {residual: directory of the stdev_combinations_*.csv files},
+            with residual 'within' and/or 'total'. The numerators and denominators are
+            saved there.
+        corr_output_dirs (dict, optional): {residual: output directory of the final correlations}.
+        n_workers (int, optional): Number of processes. Defaults to the CPU count.
+        bin_values (array, optional): Separation distances [km]. Defaults to DEFAULT_BINS.
+        between_model (str): Between-event model of the total residuals (see BETWEEN_MODELS).
+        weights (array, optional): Weights of the sub-periods, e.g. get_saavg_weights(im).
+        im (str): Name of the Saavg definition, used in the names of the final files.
+
+    Returns:
+        dict: {residual: {period: pd.DataFrame with Bin and Correlation_<model> columns}}
+    """
+    bin_values = DEFAULT_BINS if bin_values is None else np.asarray(bin_values, dtype=float)
+    eval_bins = evaluation_bins(bin_values)
+    corr_output_dirs = corr_output_dirs or {}
+    for output_dir in corr_output_dirs.values():
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    models = {residual: list(CORRELATION_MODELS) if residual == 'within' else TOTAL_MODELS
+              for residual in stdev_dirs}
+    inputs = {(residual, period): read_inputs(residual, stdev_dir, period, weights, between_model)
+              for residual, stdev_dir in stdev_dirs.items() for period in avgsa_periods}
+    # Pair-by-pair models take longest, so they are submitted first
+    units = sorted(((residual, period, model) for residual, period in inputs for model in models[residual]),
+                   key=lambda unit: CORRELATION_MODELS[unit[2]].vectorized)
+
+    from models import monteiroEtAl26
+    n_workers = n_workers or os.cpu_count() or 1
+    results = {residual: {} for residual in stdev_dirs}
+    sums = {key: {} for key in inputs}
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker,
+                             initargs=(dict(monteiroEtAl26.interpolation_grids),)) as pool:
+        futures = {pool.submit(evaluate_unit, *inputs[residual, period][:2], eval_bins, model):
+                   (residual, period, model) for residual, period, model in units}
+
+        for future in as_completed(futures):
+            residual, period, model = futures[future]
+            sums[residual, period][model] = future.result()
+            if len(sums[residual, period]) < len(models[residual]):
+                continue
+
+            # All the units of the period are done: assemble in the fixed order of the models
+            _, _, divisor, tau, rho_between = inputs[residual, period]
+            period_sums = {name: sums[residual, period][name] for name in models[residual]}
+            numerator_df, denominator_df = tables_from_sums(
+                bin_values, period_sums, divisor, tau, rho_between, weights)[residual]
+            results[residual][period] = save_period_tables(
+                residual, period, numerator_df, denominator_df, stdev_dirs, corr_output_dirs, im)
+    return results
+
+
+def save_period_tables(residual, period, numerator_df, denominator_df, stdev_dirs, corr_output_dirs, im):
+    """
+    Saves the numerators and denominators of a period in its stdev directory, and its
+    final correlations (returned) in its output directory, if any.
+    """
+    corr_df = final_corr_table(numerator_df, denominator_df)
+
+    stdev_dir = stdev_dirs[residual]
+    numerator_df.to_csv(stdev_dir / f"numerator_{period:.2f}.csv", index=False)
+    denominator_df.to_csv(stdev_dir / f"denominator_{period:.2f}.csv", index=False)
+    if residual in corr_output_dirs:
+        output_file = corr_output_dirs[residual] / f"{OUTPUT_PREFIXES[residual]}{im}({period:.2f})ind.csv"
+        corr_df.to_csv(output_file, index=False)
+        print(f"Final correlation saved: {output_file.name}")
+    return corr_df
@@ -1,19 +1,12 @@
 from pathlib import Path
 import pandas as pd
 import numpy as np
-import itertools
-import sys
-import os
 
-# Import spatial models
-from models.lothbaker13 import CrossSpatialCorrLB13
-from models.markhvidaEtAl18 import CrossSpatialCorrMCB18
-from models.duning21 import CrossSpatialCorrDN21
-from models.monteiroEtAl26 import CrossSpatialCorrMAO26
-from models.jayarambaker09 import SpatialCorrJB09
-
-# Import non-spatial models
-from models.bakerjayaram08 import corrBJ08
+from utils.prediction_files import read_predictions
+from utils.corr_engine import (
+    get_period_stdevs, compute_correlation_tensors, correlation_table, accumulate_numerators,
+    refine_numerators, quadratic_form, DEFAULT_BINS)
+from utils.saavg import weighted_stdevs
 
 
 def process_stdev_combinations(predicted_dir: Path, output_dir: Path, avgsa_periods):
@@ -24,139 +17,127 @@ def process_stdev_combinations(predicted_dir: Path, output_dir: Path, avgsa_peri
     output_dir.mkdir(parents=True, exist_ok=True)
 
     for period in avgsa_periods:
-        file_path = predicted_dir / f"predicted_Saavg2_Sa({period:.2f}).csv"
-        df = pd.read_csv(file_path)
-
         # Use first RSN only (since all RSNs share same Period-Stdev structure)
-        first_rsn = df['RSN'].iloc[0]
-        first_rsn_data = df[df['RSN'] == first_rsn]
+        first_rsn_data = read_predictions(predicted_dir, period, first_rsn_only=True)
 
-        period_to_stdev = dict(zip(first_rsn_data['Period'], first_rsn_data['Stdev3']))
-        periods = list(period_to_stdev.keys())
+        # One row per period
+        first_rsn_data = first_rsn_data.drop_duplicates('Period')
+        periods, stdevs = first_rsn_data['Period'].to_numpy(), first_rsn_data['Stdev3'].to_numpy()
 
-        combos = itertools.product(periods, periods)
-        rows = [
-            {'Period1': p1, 'Period2': p2,
-             'stdev3_period1': period_to_stdev[p1],
-             'stdev3_period2': period_to_stdev[p2]}
-            for p1, p2 in combos
-        ]
+        # Every (Period1, Period2) pair, in the order of itertools.product(periods, periods)
+        n = len(periods)
+        combinations = pd.DataFrame({
+            'Period1': np.repeat(periods, n), 'Period2': np.tile(periods, n),
+            'stdev3_period1': np.repeat(stdevs, n), 'stdev3_period2': np.tile(stdevs, n),
+        })
 
         output_file = output_dir / f"stdev_combinations_{period:.2f}.csv"
-        pd.DataFrame(rows).to_csv(output_file, index=False)
+        combinations.to_csv(output_file, index=False)
         print(f"Created: {output_file.name}")
 
 
-def compute_correlations(stdev_dir: Path, avgsa_periods):
+def compute_correlations(stdev_dir: Path, avgsa_periods, bin_values=None):
     """
     Computes correlation and numerator terms across distance bins
-    for all spatial/non-spatial models.
+    for all spatial/non-spatial models, for every pair of periods.
+
+    The per-pair table (correlation_sa_*.csv) is only a debug artifact,
+    compute_numerators does not need it.
+
+    Args:
+        bin_values (array, optional): Separation distances [km]. Defaults to DEFAULT_BINS (0-150 km every 1 km).
     """
     for period in avgsa_periods:
         stdev_file = stdev_dir / f"stdev_combinations_{period:.2f}.csv"
         stdev_df = pd.read_csv(stdev_file)
+        periods, stdevs = get_period_stdevs(stdev_df, 'stdev3')
 
-        bin_values = np.linspace(0, 150, 151) 
-        correlation_rows = []
-
-        for _, row in stdev_df.iterrows():
-            p1, p2 = row['Period1'], row['Period2']
-            s1, s2 = row['stdev3_period1'], row['stdev3_period2']
-
-            for bin_val in bin_values:
-                rho_loth = CrossSpatialCorrLB13(p1, p2, bin_val)
-                rho_markhvida = CrossSpatialCorrMCB18(p1, p2, bin_val)
-                rho_DuNing = CrossSpatialCorrDN21(f"SA({p1})", f"SA({p2})", bin_val)
-                rho_vitor = CrossSpatialCorrMAO26(f"Sa({p1})", f"Sa({p2})", bin_val, cluster=0)
-                rho_markov = corrBJ08(p1, p2) * SpatialCorrJB09(np.max([p1, p2]), bin_val, 1)
-
-                correlation_rows.append({
-                    'Bin': bin_val,
-                    'Period1': p1,
-                    'Period2': p2,
-                    'stdev3_period1': s1,
-                    'stdev3_period2': s2,
-                    'Correlation_loth': rho_loth,
-                    'Correlation_markhvida': rho_markhvida,
-                    'Correlation_DuNing': rho_DuNing,
-                    'Correlation_vitor': rho_vitor,
-                    'Correlation_markov': rho_markov,
-                    'numerator_loth': rho_loth * s1 * s2,
-                    'numerator_markhvida': rho_markhvida * s1 * s2,
-                    'numerator_DuNing': rho_DuNing * s1 * s2,
-                    'numerator_vitor': rho_vitor * s1 * s2,
-                    'numerator_markov': rho_markov * s1 * s2,
-                })
+        bin_values = DEFAULT_BINS if bin_values is None else np.asarray(bin_values, dtype=float)
+        tensors = compute_correlation_tensors(periods, bin_values)
 
         output_file = stdev_dir / f"correlation_sa_{period:.2f}.csv"
-        pd.DataFrame(correlation_rows).to_csv(output_file, index=False)
+        correlation_table(periods, stdevs, bin_values, tensors).to_csv(output_file, index=False)
         print(f"Correlation file saved: {output_file.name}")
 
 
-def compute_numerators(stdev_dir: Path, avgsa_periods):
+def get_first_rsn_stdevs(predictions_df):
     """
-    Aggregates numerators by Bin for each model and saves as separate CSVs.
+    Returns the Period and Stdev1-3 of the first RSN of a predictions DataFrame
+    (all RSNs share same Period-Stdev structure).
     """
-    for period in avgsa_periods:
-        correlation_path = stdev_dir / f"correlation_sa_{period:.2f}.csv"
-        correlation_df = pd.read_csv(correlation_path)
-
-        grouped = {
-            name: correlation_df.groupby("Bin", as_index=False)[name].sum()
-            for name in [
-                "numerator_loth", "numerator_markhvida",
-                "numerator_DuNing", "numerator_vitor", "numerator_markov"
-            ]
-        }
-
-        numerator_df = grouped["numerator_loth"]
-        for key, df in grouped.items():
-            if key != "numerator_loth":
-                numerator_df = numerator_df.merge(df, on="Bin")
+    first_rsn_data = predictions_df[predictions_df['RSN'] == predictions_df['RSN'].iloc[0]]
+    return first_rsn_data[['Period', 'Stdev1', 'Stdev2', 'Stdev3']].reset_index(drop=True)
+
 
+def numerator_table(periods, stdevs, bin_values, tolerance=None, weights=None):
+    """
+    Numerators of each model by Bin (sum of rho_ij(h) * s_i * s_j over all pairs of periods).
+    With a `tolerance`, `bin_values` is refined with refine_numerators.
+    """
+    stdevs, divisor = weighted_stdevs(stdevs, weights)
+    if tolerance is not None:
+        bin_values, numerators = refine_numerators(periods, stdevs, bin_values, tolerance=tolerance)
+    else:
+        numerators = accumulate_numerators(periods, stdevs, bin_values)
+
+    numerator_df = pd.DataFrame({'Bin': bin_values})
+    for name, numerator in numerators.items():
         # Scale down (as in your original script)
-        for col in numerator_df.columns:
-            if col.startswith("numerator_"):
-                numerator_df[col] /= 100
+        numerator_df[f"numerator_{name}"] = numerator / divisor
+    return numerator_df
+
+
+def denominator_table(periods, stdevs, weights=None):
+    """
+    Denominators of each model (zero-distance correlations), as a single-row DataFrame.
+    """
+    tensors = compute_correlation_tensors(periods, [0.0])
+    stdevs, divisor = weighted_stdevs(stdevs, weights)
+    return pd.DataFrame([{
+        f"denominator_{name}": quadratic_form(rho, stdevs)[0] / divisor
+        for name, rho in tensors.items()
+    }])
+
+
+def compute_numerators(stdev_dir: Path, avgsa_periods, bin_values=None, tolerance=None, weights=None):
+    """
+    Sums the numerators of each model by Bin, accumulated while the
+    correlations are evaluated, and saves them as separate CSVs.
+
+    Args:
+        bin_values (array, optional): Separation distances [km]. Defaults to DEFAULT_BINS (0-150 km every 1 km).
+        tolerance (float, optional): If given, `bin_values` is the initial grid of an
+            adaptive grid, refined where the correlation curves change quickly.
+        weights (array, optional): Weights of the sub-periods in ln Saavg, e.g.
+            get_saavg_weights(im). Defaults to equal weights.
+    """
+    for period in avgsa_periods:
+        stdev_file = stdev_dir / f"stdev_combinations_{period:.2f}.csv"
+        stdev_df = pd.read_csv(stdev_file)
+        periods, stdevs = get_period_stdevs(stdev_df, 'stdev3')
+
+        numerator_df = numerator_table(periods, stdevs, DEFAULT_BINS if bin_values is None else bin_values,
+                                       tolerance, weights)
 
         output_file = stdev_dir / f"numerator_{period:.2f}.csv"
         numerator_df.to_csv(output_file, index=False)
         print(f"Numerator saved: {output_file.name}")
 
 
-def compute_denominators(stdev_dir: Path, avgsa_periods):
+def compute_denominators(stdev_dir: Path, avgsa_periods, weights=None):
     """
     Computes denominators (zero-distance correlations) for all models.
+
+    Args:
+        weights (array, optional): Weights of the sub-periods in ln Saavg, e.g.
+            get_saavg_weights(im). Defaults to equal weights.
     """
     for period in avgsa_periods:
         stdev_file = stdev_dir / f"stdev_combinations_{period:.2f}.csv"
         stdev_df = pd.read_csv(stdev_file)
+        periods, stdevs = get_period_stdevs(stdev_df, 'stdev3')
 
-        rows = []
-        for _, row in stdev_df.iterrows():
-            p1, p2 = row['Period1'], row['Period2']
-            s1, s2 = row['stdev3_period1'], row['stdev3_period2']
-
-            rho_loth = CrossSpatialCorrLB13(p1, p2, 0)
-            rho_markhvida = CrossSpatialCorrMCB18(p1, p2, 0)
-            rho_DuNing = CrossSpatialCorrDN21(f"SA({p1})", f"SA({p2})", 0)
-            rho_vitor = CrossSpatialCorrMAO26(f"Sa({p1})", f"Sa({p2})", 0, cluster=0)
-            rho_markov = corrBJ08(p1, p2)
-
-            rows.append({
-                'denominator_loth': rho_loth * s1 * s2,
-                'denominator_markhvida': rho_markhvida * s1 * s2,
-                'denominator_DuNing': rho_DuNing * s1 * s2,
-                'denominator_vitor': rho_vitor * s1 * s2,
-                'denominator_markov': rho_markov * s1 * s2,
-            })
-
-        df = pd.DataFrame(rows)
-
-        denominator_df = pd.DataFrame([{
-            f"{key}": df[key].sum() / 100
-            for key in df.columns
-        }])
+        denominator_df = denominator_table(periods, stdevs, weights)
 
         output_file = stdev_dir / f"denominator_{period:.2f}.csv"
         denominator_df.to_csv(output_file, index=False)
@@ -1,21 +1,17 @@
 from pathlib import Path
 import pandas as pd
 import numpy as np
-import itertools
-import sys
-import os
 
-# Import spatial models
-from models.lothbaker13 import CrossSpatialCorrLB13
-from models.markhvidaEtAl18 import CrossSpatialCorrMCB18
-from models.duning21 import CrossSpatialCorrDN21
-from models.monteiroEtAl26 import CrossSpatialCorrMAO26
-from openquake.hazardlib.cross_correlation import GodaAtkinson2009
-from openquake.hazardlib.imt import SA
-ga09_model = GodaAtkinson2009()
+from utils.prediction_files import read_predictions
 
-# Import non-spatial models
-from models.bakerjayaram08 import corrBJ08
+from functools import lru_cache
+
+from utils.corr_engine import (get_period_stdevs, compute_correlation_tensors, residual_tables, DEFAULT_BINS,
+                               TOTAL_MODELS)
+
+# OpenQuake cross-correlation models available for the between-event term, i.e. those
+# defined for Sa-Sa pairs (Bradley2012 only correlates PGV with the other IMs, so it is not included)
+BETWEEN_MODELS = ['GodaAtkinson2009', 'BakerJayaram2008', 'NoCrossCorrelation', 'FullCrossCorrelation']
 
 
 def process_stdev_combinations_total(predicted_dir: Path, output_dir: Path, avgsa_periods):
@@ -26,154 +22,153 @@ def process_stdev_combinations_total(predicted_dir: Path, output_dir: Path, avgs
     output_dir.mkdir(parents=True, exist_ok=True)
 
     for period in avgsa_periods:
-        file_path = predicted_dir / f"predicted_Saavg2_sa({period:.2f}).csv"
-        df = pd.read_csv(file_path)
-
         # Use first RSN only (since all RSNs share same Period-Stdev structure)
-        first_rsn = df['RSN'].iloc[0]
-        first_rsn_data = df[df['RSN'] == first_rsn]
-
-        period_to_stdev1 = dict(zip(first_rsn_data['Period'], first_rsn_data['Stdev1']))
-        period_to_stdev2 = dict(zip(first_rsn_data['Period'], first_rsn_data['Stdev2']))
-        period_to_stdev3 = dict(zip(first_rsn_data['Period'], first_rsn_data['Stdev3']))
-        periods = list(period_to_stdev3.keys())
-
-        combos = itertools.product(periods, periods)
-        rows = [
-            {'Period1': p1, 'Period2': p2,
-            'stdev1_period1': period_to_stdev1[p1],
-            'stdev1_period2': period_to_stdev1[p2],
-            'stdev2_period1': period_to_stdev2[p1],
-            'stdev2_period2': period_to_stdev2[p2],
-            'stdev3_period1': period_to_stdev3[p1],
-            'stdev3_period2': period_to_stdev3[p2]}
-            for p1, p2 in combos
-        ]
+        first_rsn_data = read_predictions(predicted_dir, period, first_rsn_only=True)
+
+        # One row per period
+        first_rsn_data = first_rsn_data.drop_duplicates('Period')
+        periods = first_rsn_data['Period'].to_numpy()
+
+        # Every (Period1, Period2) pair, in the order of itertools.product(periods, periods)
+        n = len(periods)
+        combinations = {'Period1': np.repeat(periods, n), 'Period2': np.tile(periods, n)}
+        for k in (1, 2, 3):
+            stdevs = first_rsn_data[f'Stdev{k}'].to_numpy()
+            combinations[f'stdev{k}_period1'] = np.repeat(stdevs, n)
+            combinations[f'stdev{k}_period2'] = np.tile(stdevs, n)
 
         output_file = output_dir / f"stdev_combinations_{period:.2f}.csv"
-        pd.DataFrame(rows).to_csv(output_file, index=False)
+        pd.DataFrame(combinations).to_csv(output_file, index=False)
         print(f"Created: {output_file.name}")
 
 
-def compute_correlations_total(stdev_dir: Path, avgsa_periods):
+@lru_cache(maxsize=None)
+def get_between_model(name='GodaAtkinson2009'):
+    # OpenQuake is only loaded when between-event correlations are needed
+    if name not in BETWEEN_MODELS:
+        raise ValueError(f"Unknown between-event model '{name}', use one of {BETWEEN_MODELS}.")
+    from openquake.hazardlib import cross_correlation
+    return getattr(cross_correlation, name)()
+
+
+@lru_cache(maxsize=128)
+def between_event_matrix(periods, model):
+    from openquake.hazardlib.imt import SA
+    between_model = get_between_model(model)
+    rho = np.array([[between_model.get_correlation(SA(p1), SA(p2)) for p2 in periods] for p1 in periods],
+                   dtype=float)
+    # Shared by every caller with the same periods
+    rho.flags.writeable = False
+    return rho
+
+
+def between_event_correlation(periods, model='GodaAtkinson2009'):
+    """
+    Between-event correlations of Sa(T) for every pair of periods, from an OpenQuake
+    cross-correlation model (see BETWEEN_MODELS). They do not depend on the distance,
+    so they are computed once per set of periods and cached.
+    """
+    return between_event_matrix(tuple(float(p) for p in periods), model)
+
+
+def get_total_stdevs(stdev_df):
+    """
+    Returns the periods, between-event (stdev2) and within-event (stdev3) stdevs
+    from a stdev_combinations DataFrame.
+    """
+    periods, tau = get_period_stdevs(stdev_df, 'stdev2')
+    _, phi = get_period_stdevs(stdev_df, 'stdev3')
+    return periods, tau, phi
+
+
+def compute_correlations_total(stdev_dir: Path, avgsa_periods, between_model='GodaAtkinson2009', bin_values=None):
     """
     Computes correlation and numerator terms across distance bins
-    for all spatial/non-spatial models.
+    for all spatial/non-spatial models, for every pair of periods.
+
+    The per-pair table (correlation_sa_*.csv) is only a debug artifact,
+    compute_numerators_total does not need it.
+
+    Args:
+        bin_values (array, optional): Separation distances [km]. Defaults to DEFAULT_BINS (0-150 km every 1 km).
     """
     for period in avgsa_periods:
         stdev_file = stdev_dir / f"stdev_combinations_{period:.2f}.csv"
         stdev_df = pd.read_csv(stdev_file)
-
-        bin_values = np.linspace(0, 150, 151)
-        correlation_rows = []
-
-        for _, row in stdev_df.iterrows():
-            p1, p2 = row['Period1'], row['Period2']
-            std2_1, std2_2 = row['stdev2_period1'], row['stdev2_period2']
-            std3_1, std3_2 = row['stdev3_period1'], row['stdev3_period2']
-
-            for bin_val in bin_values:
-                rho_loth = CrossSpatialCorrLB13(p1, p2, bin_val)
-                rho_markhvida = CrossSpatialCorrMCB18(p1, p2, bin_val)
-                rho_DuNing = CrossSpatialCorrDN21(f"SA({p1})", f"SA({p2})", bin_val)
-                rho_vitor = CrossSpatialCorrMAO26(f"Sa({p1})", f"Sa({p2})", bin_val, cluster=0)
-                imt1 = SA(p1)
-                imt2 = SA(p2)
-                rho_between = ga09_model.get_correlation(imt1, imt2)
-
-                correlation_rows.append({
-                    'Bin': bin_val,
-                    'Period1': p1,
-                    'Period2': p2,
-                    'stdev2_period1': std2_1,
-                    'stdev2_period2': std2_2,
-                    'stdev3_period1': std3_1,
-                    'stdev3_period2': std3_2,
-                    'Correlation_loth': rho_loth,
-                    'Correlation_markhvida': rho_markhvida,
-                    'Correlation_DuNing': rho_DuNing,
-                    'Correlation_vitor': rho_vitor,
-                    'Correlation_between': rho_between,
-                    'numerator_between': rho_between * std2_1 * std2_2,
-                    'numerator_between': rho_between * std2_1 * std2_2,
-                    'numerator_loth': (rho_between * std2_1 * std2_2 + rho_loth * std3_1 * std3_2),
-                    'numerator_markhvida': (rho_between * std2_1 * std2_2 + rho_markhvida * std3_1 * std3_2),
-                    'numerator_DuNing': (rho_between * std2_1 * std2_2 + rho_DuNing * std3_1 * std3_2),
-                    'numerator_vitor': (rho_between * std2_1 * std2_2 + rho_vitor * std3_1 * std3_2),
-                })
+        periods, tau, phi = get_total_stdevs(stdev_df)
+
+        bin_values = DEFAULT_BINS if bin_values is None else np.asarray(bin_values, dtype=float)
+        n, n_bins = len(periods), len(bin_values)
+        tensors = compute_correlation_tensors(periods, bin_values, TOTAL_MODELS)
+        rho_between = np.broadcast_to(between_event_correlation(periods, between_model)[:, :, None], (n, n, n_bins))
+        between = rho_between * np.outer(tau, tau)[:, :, None]
+        within_weights = np.outer(phi, phi)[:, :, None]
+
+        table = {
+            'Bin': np.tile(bin_values, n * n),
+            'Period1': np.repeat(periods, n * n_bins),
+            'Period2': np.tile(np.repeat(periods, n_bins), n),
+            'stdev2_period1': np.repeat(tau, n * n_bins),
+            'stdev2_period2': np.tile(np.repeat(tau, n_bins), n),
+            'stdev3_period1': np.repeat(phi, n * n_bins),
+            'stdev3_period2': np.tile(np.repeat(phi, n_bins), n),
+        }
+        for name in TOTAL_MODELS:
+            table[f'Correlation_{name}'] = tensors[name].ravel()
+        table['Correlation_between'] = rho_between.ravel()
+        table['numerator_between'] = between.ravel()
+        for name in TOTAL_MODELS:
+            table[f'numerator_{name}'] = (between + tensors[name] * within_weights).ravel()
 
         output_file = stdev_dir / f"correlation_sa_{period:.2f}.csv"
-        pd.DataFrame(correlation_rows).to_csv(output_file, index=False)
+        pd.DataFrame(table).to_csv(output_file, index=False)
         print(f"Correlation file saved: {output_file.name}")
 
 
-def compute_numerators_total(stdev_dir: Path, avgsa_periods):
+def compute_numerators_total(stdev_dir: Path, avgsa_periods, between_model='GodaAtkinson2009',
+                             bin_values=None, tolerance=None, weights=None):
     """
-    Aggregates numerators by Bin for each model and saves as separate CSVs.
+    Sums the total-residual numerators of each model by Bin, accumulated while
+    the correlations are evaluated, and saves them as separate CSVs.
+
+    Args:
+        bin_values (array, optional): Separation distances [km]. Defaults to DEFAULT_BINS (0-150 km every 1 km).
+        tolerance (float, optional): If given, `bin_values` is the initial grid of an
+            adaptive grid, refined where the correlation curves change quickly.
+        weights (array, optional): Weights of the sub-periods in ln Saavg, e.g.
+            get_saavg_weights(im). Defaults to equal weights.
     """
     for period in avgsa_periods:
-        correlation_path = stdev_dir / f"correlation_sa_{period:.2f}.csv"
-        correlation_df = pd.read_csv(correlation_path)
-
-        grouped = {
-            name: correlation_df.groupby("Bin", as_index=False)[name].sum()
-            for name in [
-                "numerator_loth", "numerator_markhvida",
-                "numerator_DuNing", "numerator_vitor"
-            ]
-        }
-
-        numerator_df = grouped["numerator_loth"]
-        for key, df in grouped.items():
-            if key != "numerator_loth":
-                numerator_df = numerator_df.merge(df, on="Bin")
+        stdev_file = stdev_dir / f"stdev_combinations_{period:.2f}.csv"
+        stdev_df = pd.read_csv(stdev_file)
+        periods, tau, phi = get_total_stdevs(stdev_df)
 
-        # Scale down (as in your original script)
-        for col in numerator_df.columns:
-            if col.startswith("numerator_"):
-                numerator_df[col] /= 100
+        numerator_df, _ = residual_tables(periods, phi, DEFAULT_BINS if bin_values is None else bin_values,
+                                          TOTAL_MODELS, tau, between_event_correlation(periods, between_model),
+                                          tolerance, weights)['total']
 
         output_file = stdev_dir / f"numerator_{period:.2f}.csv"
         numerator_df.to_csv(output_file, index=False)
         print(f"Numerator saved: {output_file.name}")
 
 
-def compute_denominators_total(stdev_dir: Path, avgsa_periods):
+def compute_denominators_total(stdev_dir: Path, avgsa_periods, between_model='GodaAtkinson2009',
+                               weights=None):
     """
     Computes denominators (zero-distance correlations) for all models.
+
+    Args:
+        weights (array, optional): Weights of the sub-periods in ln Saavg, e.g.
+            get_saavg_weights(im). Defaults to equal weights.
     """
     for period in avgsa_periods:
         stdev_file = stdev_dir / f"stdev_combinations_{period:.2f}.csv"
         stdev_df = pd.read_csv(stdev_file)
+        periods, tau, phi = get_total_stdevs(stdev_df)
 
-        rows = []
-        for _, row in stdev_df.iterrows():
-            p1, p2 = row['Period1'], row['Period2']
-            std2_1, std2_2 = row['stdev2_period1'], row['stdev2_period2']
-            std3_1, std3_2 = row['stdev3_period1'], row['stdev3_period2']
-
-            rho_loth = CrossSpatialCorrLB13(p1, p2, 0)
-            rho_markhvida = CrossSpatialCorrMCB18(p1, p2, 0)
-            rho_DuNing = CrossSpatialCorrDN21(f"SA({p1})", f"SA({p2})", 0)
-            rho_vitor = CrossSpatialCorrMAO26(f"Sa({p1})", f"Sa({p2})", 0, cluster=0)
-            imt1 = SA(p1)
-            imt2 = SA(p2)
-            rho_between = ga09_model.get_correlation(imt1, imt2)
-        
-            rows.append({
-                'Correlation_between': rho_between,
-                'denominator_loth': (rho_between * std2_1 * std2_2 + rho_loth * std3_1 * std3_2),
-                'denominator_markhvida': (rho_between * std2_1 * std2_2 + rho_markhvida * std3_1 * std3_2),
-                'denominator_DuNing': (rho_between * std2_1 * std2_2 + rho_DuNing * std3_1 * std3_2),
-                'denominator_vitor': (rho_between * std2_1 * std2_2 + rho_vitor * std3_1 * std3_2),
-            })
-
-        df = pd.DataFrame(rows)
-
-        denominator_df = pd.DataFrame([{
-            f"{key}": df[key].sum() / 100
-            for key in df.columns
-        }])
+        _, denominator_df = residual_tables(periods, phi, [0.0], TOTAL_MODELS, tau,
+                                            between_event_correlation(periods, between_model),
+                                            weights=weights)['total']
 
         output_file = stdev_dir / f"denominator_{period:.2f}.csv"
         denominator_df.to_csv(output_file, index=False)